@@ -1,21 +1,277 @@
 """VCFDataFrame main class."""
-from VCFDataFrame.io import _load_panel, _load_vcf
+import logging
+import os
+import re
+
+from VCFDataFrame import __version__
+from VCFDataFrame.cohort import _merge_reduced, _reduce_frame
+from VCFDataFrame.genotypes import Genotypes
+from VCFDataFrame.intervals import VCFAccessor
+from VCFDataFrame.io import (
+    BATCH_SIZE,
+    VARIANT_KEYS,
+    _build_frame,
+    _cache_key,
+    _deserialize_frame,
+    _header_contigs,
+    _header_info,
+    _info_types,
+    _is_indexed,
+    _is_stream,
+    _iter_reference,
+    _iter_vcf,
+    _load_panel,
+    _load_pieces,
+    _load_vcf,
+    _merge_regions,
+    _open_vcf,
+    _read_cache,
+    _read_feather,
+    _read_parquet,
+    _reference_windows,
+    _run_jobs,
+    _serialize_frame,
+    _sites_header,
+    _split_regions,
+    _write_cache,
+    _write_feather,
+    _write_parquet,
+    _write_vcf,
+)
+from VCFDataFrame.pipeline import DEFAULT_PIPELINE
+from VCFDataFrame.profiling import NO_PROFILER, Profiler
+from VCFDataFrame.scan import VCFScan
+from VCFDataFrame.schema import VCFSchema, _ann_fields
 
 import numpy as np
 
 import pandas as pd
 
 
+IMPACT_SEVERITY = {
+    "exon_loss_variant": 1,
+    "frameshift_variant": 2,
+    "stop_gained": 3,
+    "stop_lost": 4,
+    "start_lost": 5,
+    "splice_acceptor_variant": 6,
+    "splice_donor_variant": 7,
+    "disruptive_inframe_deletion": 8,
+    "inframe_insertion": 9,
+    "disruptive_inframe_insertion": 10,
+    "inframe_deletion": 11,
+    "missense_variant": 12,
+    "splice_region_variant": 13,
+    "stop_retained_variant": 14,
+    "initiator_codon_variant": 15,
+    "synonymous_variant": 16,
+    "start_retained": 17,
+    "coding_sequence_variant": 18,
+    "5_prime_UTR_variant": 19,
+    "3_prime_UTR_variant": 20,
+    "5_prime_UTR_premature_start_codon_gain_variant": 21,
+    "intron_variant": 22,
+    "non_coding_exon_variant": 23,
+    "upstream_gene_variant": 24,
+    "downstream_gene_variant": 25,
+    "TF_binding_site_variant": 26,
+    "regulatory_region_variant": 27,
+    "intergenic_region": 28,
+    "transcript": 29,
+}
+
+
+CLINVAR_TRANSLATION = {
+    "255": "other",
+    "0": "Uncertain significance",
+    "1": "not provided",
+    "2": "Benign",
+    "3": "Likely Benign",
+    "4": "Likely pathogenic",
+    "5": "Pathogenic",
+    "6": "drug response",
+    "7": "histocompatibility",
+}
+
+# ANN fields renamed when ESP6500 is parsed
+ANN_RENAMES = {"ANNOTATION": "EFFECT", "ANNOTATION_IMPACT": "IMPACT"}
+
+
+def _vcf_strings(values):
+    """Format a column as strings, with empty strings for missing values."""
+    strings = values.astype(object).where(values.notna(), "").astype(str)
+    return strings.where(~strings.isin([".", "nan", "None"]), "")
+
+
+def _map_unique(values, func):
+    """Compute func on the distinct values of a Series only.
+
+    func takes a Series of the distinct values and returns one of the
+    same length, spread back to every row with the factorized codes.
+    Missing values are given to func as a single trailing NaN, which
+    the -1 code of missing rows picks.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = np.append(np.asarray(uniques, dtype=object), np.nan)
+    mapped = np.asarray(func(pd.Series(uniques, dtype=object)))
+    return pd.Series(mapped[codes], index=values.index, name=values.name)
+
+
+def _translate_tokens(values, translation):
+    """Map every token of values through translation.
+
+    Tokens are separated by "|" or ",", which are kept, and tokens
+    missing from translation are left as they are. Every distinct value
+    is translated once and spread back with its factorized codes.
+    """
+    codes, uniques = pd.factorize(values)
+    translated = np.array(
+        [
+            "".join(
+                translation.get(token, token)
+                for token in re.split(r"([|,])", value)
+            )
+            if isinstance(value, str)
+            else value
+            for value in uniques
+        ],
+        dtype=object,
+    )
+    result = values.to_numpy(dtype=object, copy=True)
+    present = codes >= 0
+    result[present] = translated[codes[present]]
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def _read_vcf_job(vcf, kwargs, serialize):
+    """Read a VCF in a worker, serializing it for the trip back."""
+    vcf_df = VCFDataFrame.read_vcf(vcf, **kwargs)
+    genotypes = getattr(vcf_df, "_genotypes", None)
+    profile = getattr(vcf_df, "_profile", None)
+    if serialize:
+        return _serialize_frame(vcf_df), vcf_df.metadata, genotypes, profile
+    return vcf_df, vcf_df.metadata, genotypes, profile
+
+
+def _reduce_vcf_job(vcf, kwargs):
+    """Read a VCF in a worker and reduce it to its cohort codes."""
+    return _reduce_frame(VCFDataFrame.read_vcf(vcf, **kwargs))
+
+
+CATEGORICAL_COLUMNS = [
+    "CHROM",
+    "FILTER",
+    "EFFECT",
+    "IMPACT",
+    "GENE_NAME",
+    "ZIGOSITY",
+    "CLINVAR_CLNSIG",
+]
+
+NUMERIC_COLUMNS = [
+    "QUAL",
+    "ESP6500_MAF_EA",
+    "ESP6500_MAF_AA",
+    "ESP6500_MAF_ALL",
+    "POLYPHEN_SCORE",
+]
+
+
+def _read_pieces_job(
+    vcf,
+    pieces,
+    previous,
+    options,
+    genotypes=False,
+    memory=None,
+    serialize=False,
+):
+    """Parse and process some pieces of an indexed VCF in a worker.
+
+    With memory set to a bool the stages are profiled, tracing memory
+    allocations if True, and their records returned. With serialize the
+    DataFrame is serialized for the trip back.
+    """
+    profiler = NO_PROFILER if memory is None else Profiler(memory=memory)
+    vcf_df, _, pVCF, info_found = profiler.run(
+        "load_vcf", _load_pieces, vcf, pieces, previous, genotypes
+    )
+    vcf_df = VCFDataFrame._process_vcf(
+        vcf_df, pVCF, profiler=profiler, **options
+    )
+    genotypes = getattr(vcf_df, "_genotypes", None)
+    if serialize:
+        vcf_df = _serialize_frame(vcf_df)
+    return vcf_df, genotypes, list(profiler.records), info_found
+
+
 class VCFDataFrame(pd.DataFrame):
     """Class to extend pandas dataframe using Variant Calling Format."""
 
-    _metadata = ["name"]
+    _metadata = ["name", "header", "_genotypes", "_profile"]
 
     @property
     def _constructor(self):
         """Construct VCFDataFrame class."""
         return VCFDataFrame
 
+    @property
+    def metadata(self):
+        """Sample name and raw VCF header, None when they are not set."""
+        return dict(
+            name=getattr(self, "name", None),
+            header=getattr(self, "header", None),
+        )
+
+    @property
+    def genotypes(self):
+        """Genotypes and FORMAT fields, read with read_vcf(genotypes=...).
+
+        Arrays follow the rows of the VCFDataFrame, also after filtering
+        or sorting it, as long as the index is kept.
+        """
+        genotypes = getattr(self, "_genotypes", None)
+        if genotypes is None:
+            raise ValueError(
+                "Genotypes not loaded, read the VCF with genotypes=True"
+            )
+        return genotypes.align(self.index)
+
+    @property
+    def vcf(self):
+        """Genomic region queries backed by an interval index.
+
+        The index is built on the first query and kept with the frame,
+        see VCFDataFrame.intervals.VCFAccessor.
+        """
+        accessor = self.__dict__.get("_vcf_accessor")
+        if accessor is None:
+            accessor = VCFAccessor(self)
+            # Set directly, pandas warns about new attributes otherwise
+            object.__setattr__(self, "_vcf_accessor", accessor)
+        return accessor
+
+    @property
+    def profile(self):
+        """Timing report of the read, read with read_vcf(profile=...).
+
+        One row per pipeline stage, see Profiler.report.
+        """
+        profile = getattr(self, "_profile", None)
+        if profile is None:
+            raise ValueError(
+                "Read not profiled, read the VCF with profile=True"
+            )
+        return profile
+
+    @classmethod
+    def _with_metadata(cls, df, metadata):
+        """Wrap a DataFrame in a VCFDataFrame setting its metadata."""
+        vcf_df = df.pipe(VCFDataFrame)
+        vcf_df.name = metadata.get("name")
+        vcf_df.header = metadata.get("header")
+        return vcf_df
+
     @classmethod
     def read_vcf(
         cls,
@@ -26,13 +282,26 @@ class VCFDataFrame(pd.DataFrame):
         parse_ESP=True,
         parse_CLINVAR=True,
         round_nums=6,
+        regions=None,
+        panel=None,
+        keep_ann="top",
+        n_jobs=1,
+        dtypes="str",
+        cache_dir=None,
+        cache_size=2 ** 30,
+        genotypes=False,
+        profile=False,
+        pipeline=None,
+        threads=None,
     ):
         """Read VCF file to Pandas DataFrame.
 
         Parameters
         ----------
-        vcf: str
-            Path to vcf file
+        vcf: str or file object
+            Path to vcf file, plain or bgzipped VCF or BCF. "-" or a
+            file object with a file descriptor, like sys.stdin or an open
+            file, is read as a stream
         priorize_ann: bool, dict
             Priorize annotations, receives bool or priorization dict
         aminochange: bool
@@ -45,233 +314,972 @@ class VCFDataFrame(pd.DataFrame):
             Parse and translate CLINVAR annotation codes
         round_nums: int or None
             Round nums to N decimals. None value will stop round method
+        regions: list or str, optional
+            Regions ("chr1", "chr1:1000-2000") or path to a BED file.
+            Only variants overlapping them are read, using the tabix or
+            CSI index of a bgzipped VCF
+        panel: str, optional
+            Path to a panel excel file. Variants without annotations on
+            panel genes are dropped, and annotations on other genes are
+            discarded, before processing
+        keep_ann: str
+            Annotations kept when priorizing: "top" keeps the most severe
+            one, "gene" the most severe one of each gene and "all" keeps
+            every annotation, one row each
+        n_jobs: int or None
+            Number of worker processes. With more than one, an indexed
+            VCF is split in genomic ranges that are parsed and processed
+            in parallel, giving the same result as a serial read. None
+            or -1 use every CPU
+        dtypes: str
+            "str" formats every value as string with "." for missing
+            values. "typed" keeps numeric INFO fields as float or
+            nullable Int64, flags as bool and repetitive columns as
+            categoricals, with missing values left as NaN
+        cache_dir: str, optional
+            Directory where processed VCFs are cached. The cache is keyed
+            by the VCF path, size and modification time, the package
+            version and every option changing the result, so a VCF read
+            again with the same options is loaded from the cache
+        cache_size: int
+            Size in bytes the cache is kept under, removing the least
+            recently used entries first
+        genotypes: bool or list of str
+            Read the genotypes and FORMAT fields of every sample, True
+            reads every FORMAT field and a list only the given ones. They
+            are kept in NumPy arrays, available from the genotypes
+            property. VCFs read with genotypes are not cached
+        profile: bool or Profiler
+            Record the wall time, rows in and out and process peak RSS of
+            every stage, available as a DataFrame from the profile
+            property of the result. Pass a
+            VCFDataFrame.profiling.Profiler to get every record in a
+            callback or trace the memory allocated by every stage
+        pipeline: Pipeline, optional
+            Processing stages run on the parsed VCF, by default
+            VCFDataFrame.pipeline.DEFAULT_PIPELINE. Stages can be added,
+            dropped or reordered, see Pipeline. Cached reads are keyed by
+            the stage names and functions
+        threads: int, optional
+            Number of htslib threads decompressing bgzipped VCFs and BCFs
+            while records are parsed. Used by serial reads, parallel
+            reads decompress in every worker
 
         Returns
         -------
         vcf_df: VCFDataFrame
             VCF file in DataFrame format
         """
-        vcf_df, sample_name, pVCF = _load_vcf(vcf)
-        vcf_df = vcf_df.pipe(VCFDataFrame)
-        vcf_df = vcf_df._treat_alt_alleles()
-        if priorize_ann is True:
-            vcf_df = vcf_df._priorize_annotations(pVCF)
-        elif isinstance(priorize_ann, dict):
-            vcf_df = vcf_df._priorize_annotations(pVCF, priorize_ann)
-        vcf_df.columns = vcf_df.columns.str.upper()
-        if aminochange is True:
-            vcf_df._calc_aminochange()
-        if zigosity is True:
-            vcf_df = vcf_df._map_zigosity()
-        if parse_ESP is True:
-            vcf_df = vcf_df._process_ESP6500()
-        if parse_CLINVAR is True:
-            vcf_df = vcf_df._process_CLINVAR()
-        if round_nums is not None:
-            vcf_df = vcf_df._round_num_cols(pVCF, round_nums)
-        vcf_df.replace(["nan", "", np.nan], ".", inplace=True)
-        vcf_df.replace([[None], "."], inplace=True, regex=True)
-        vcf_df = vcf_df.astype("str")
-        vcf_df["POS"] = vcf_df["POS"].astype(int)
-        vcf_df = vcf_df.pipe(VCFDataFrame)
-        vcf_df.name = sample_name
+        profiler = NO_PROFILER
+        if profile is True:
+            profiler = Profiler()
+        elif profile:
+            profiler = profile
+        gene_symbol_list = None if panel is None else _load_panel(panel)
+        options = dict(
+            priorize_ann=priorize_ann,
+            aminochange=aminochange,
+            zigosity=zigosity,
+            parse_ESP=parse_ESP,
+            parse_CLINVAR=parse_CLINVAR,
+            round_nums=round_nums,
+            gene_symbol_list=gene_symbol_list,
+            keep_ann=keep_ann,
+            pipeline=pipeline,
+        )
+        cached = None
+        if genotypes:
+            cache_dir = None
+        if _is_stream(vcf) or not isinstance(vcf, str):
+            cache_dir = None
+        if cache_dir is not None:
+            key = _cache_key(
+                vcf, dict(options, regions=regions, dtypes=dtypes), __version__
+            )
+            cached = profiler.run("read_cache", _read_cache, cache_dir, key)
+        if cached is not None:
+            vcf_df = cls._with_metadata(*cached)
+        else:
+            vcf_df = cls._read_vcf_uncached(
+                vcf,
+                regions,
+                n_jobs,
+                dtypes,
+                options,
+                genotypes,
+                profiler,
+                threads,
+            )
+            if cache_dir is not None:
+                profiler.run(
+                    "write_cache",
+                    _write_cache,
+                    cache_dir,
+                    key,
+                    vcf_df,
+                    vcf_df.metadata,
+                    cache_size,
+                )
+        if profile:
+            vcf_df._profile = profiler.report()
+        if gene_symbol_list is not None and len(vcf_df) < 1:
+            raise RuntimeError("Panel Result is empty")
         return vcf_df
 
-    def _round_num_cols(self, pVCF, round_nums):
-        numcols = list()
-        for x in pVCF.header_iter():
-            if x.type == "INFO":
-                if x["Type"] in ["Float", "Integer"]:
-                    numcols.append(x["ID"])
-        additional_cols = [
-            i
-            for i in self.columns
-            if i in ["ESP6500_MAF_EA", "ESP6500_MAF_AA", "ESP6500_MAF_ALL"]
+    @classmethod
+    def _read_vcf_uncached(
+        cls,
+        vcf,
+        regions,
+        n_jobs,
+        dtypes,
+        options,
+        genotypes=False,
+        profiler=NO_PROFILER,
+        threads=None,
+    ):
+        """Parse, process and format a VCF, see read_vcf."""
+        if n_jobs != 1 and _is_indexed(vcf):
+            vcf_df, sample_name, pVCF = cls._read_vcf_pieces(
+                vcf, regions, n_jobs, options, genotypes, profiler
+            )
+        else:
+            if n_jobs != 1:
+                logging.warning(
+                    "n_jobs needs a bgzipped and indexed VCF, reading serially"
+                )
+            vcf_df, sample_name, pVCF = profiler.run(
+                "load_vcf", _load_vcf, vcf, regions, genotypes, threads
+            )
+            vcf_df = cls._process_vcf(
+                vcf_df, pVCF, profiler=profiler, **options
+            )
+        return profiler.run(
+            "format_vcf", cls._format_vcf, vcf_df, sample_name, pVCF, dtypes
+        )
+
+    @classmethod
+    def read_vcfs(cls, vcfs, n_jobs=None, backend="process", **kwargs):
+        """Read several VCF files in parallel.
+
+        Parameters
+        ----------
+        vcfs: list of str
+            Paths to vcf files
+        n_jobs: int or None
+            Number of workers. None or -1 use every CPU, 1 reads serially
+        backend: str
+            "process" reads every file in a worker process, "thread"
+            uses a thread pool in the current process
+        kwargs
+            Keyword arguments passed to read_vcf
+
+        Returns
+        -------
+        vcf_dfs: list of VCFDataFrame
+            VCF files in DataFrame format, in the same order as vcfs
+        """
+        serialize = backend == "process"
+        jobs = [(vcf, kwargs, serialize) for vcf in vcfs]
+        vcf_dfs = list()
+        for data, metadata, genotypes, profile in _run_jobs(
+            _read_vcf_job, jobs, n_jobs, backend
+        ):
+            vcf_df = cls._with_metadata(_deserialize_frame(data), metadata)
+            vcf_df._genotypes = genotypes
+            vcf_df._profile = profile
+            vcf_dfs.append(vcf_df)
+        return vcf_dfs
+
+    @classmethod
+    def merge_samples(cls, vcfs, n_jobs=None, backend="process", **kwargs):
+        """Merge the variants of many samples in a cohort matrix.
+
+        Every VCF is reduced, in parallel, to integer codes of its
+        variants, by contig, POS and REF/ALT, and of their zigosity,
+        before a single sorted merge of all of them. Only the codes of
+        every VCF are kept in memory, not its processed DataFrame.
+
+        Parameters
+        ----------
+        vcfs: list of str or VCFDataFrame
+            Paths to VCF files or VCFDataFrames, one per sample or with
+            genotypes read for several samples
+        n_jobs: int or None
+            Number of workers reading the VCF files
+        backend: str
+            "process" or "thread", see read_vcfs
+        kwargs
+            Keyword arguments passed to read_vcf
+
+        Returns
+        -------
+        cohort: VCFDataFrame
+            One row per variant, sorted by contig and POS, with CHROM,
+            POS, REF, ALT, the number of samples carrying it (N_SAMPLES),
+            heterozygous (N_HET) and homozygous (N_HOM), and a sparse
+            int8 column per sample: 0 absent, 1 HET, 2 HOM and 3 carried
+            with unknown zigosity
+
+        Raises
+        ------
+        ValueError
+            If a sample name is found more than once
+        """
+        reduced = [
+            None if isinstance(vcf, str) else _reduce_frame(vcf)
+            for vcf in vcfs
         ]
-        numcols += additional_cols
-        numcols = list(
-            set(
-                [
-                    x.upper()
-                    for x in numcols
-                    for y in self.columns
-                    if x.upper() == y
-                ]
+        paths = [vcf for vcf in vcfs if isinstance(vcf, str)]
+        jobs = [(vcf, kwargs) for vcf in paths]
+        read = iter(_run_jobs(_reduce_vcf_job, jobs, n_jobs, backend))
+        reduced = [next(read) if x is None else x for x in reduced]
+        variants, columns = _merge_reduced(reduced)
+        cohort = cls(pd.DataFrame(dict(variants, **columns)))
+        cohort.name = "cohort"
+        return cohort
+
+    @classmethod
+    def scan_vcf(
+        cls,
+        vcf,
+        priorize_ann=True,
+        aminochange=True,
+        zigosity=True,
+        parse_ESP=True,
+        parse_CLINVAR=True,
+        round_nums=6,
+        regions=None,
+        keep_ann="top",
+        dtypes="str",
+        pipeline=None,
+    ):
+        """Lazily read a VCF file.
+
+        Filters, column selections and panels are recorded on the
+        returned VCFScan and only applied by its collect method, which
+        skips the INFO fields they do not need and drops rows as early as
+        possible.
+
+        Parameters
+        ----------
+        vcf: str
+            Path to vcf file, plain or bgzipped
+        priorize_ann, aminochange, zigosity, parse_ESP, parse_CLINVAR,
+        round_nums, regions, keep_ann, dtypes, pipeline
+            See read_vcf
+
+        Returns
+        -------
+        scan: VCFScan
+            Lazy read of the VCF
+
+        Examples
+        --------
+        >>> scan = VCFDataFrame.scan_vcf("sample.vcf")
+        >>> scan = scan.filter("IMPACT", "==", "HIGH").filter("DP", ">", 10)
+        >>> vcf_df = scan.select("CHROM", "POS", "GENE_NAME").collect()
+        """
+        if _is_stream(vcf):
+            raise TypeError("scan_vcf needs a path, streams are read once")
+        options = dict(
+            priorize_ann=priorize_ann,
+            aminochange=aminochange,
+            zigosity=zigosity,
+            parse_ESP=parse_ESP,
+            parse_CLINVAR=parse_CLINVAR,
+            round_nums=round_nums,
+            regions=regions,
+            keep_ann=keep_ann,
+            dtypes=dtypes,
+            pipeline=pipeline,
+        )
+        return VCFScan(cls, vcf, options)
+
+    @classmethod
+    def read_parquet(cls, path, columns=None, filters=None):
+        """Read a VCFDataFrame written with to_parquet.
+
+        Parameters
+        ----------
+        path: str
+            Path to a Parquet file or partitioned dataset directory
+        columns: list of str, optional
+            Columns to read, by default every column is read
+        filters: list, optional
+            Predicates in pyarrow format, like [("CHROM", "==", "chr1")].
+            Partitions and row groups not matching them are skipped
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            VCF in DataFrame format, with its name and header
+        """
+        return cls._with_metadata(*_read_parquet(path, columns, filters))
+
+    @classmethod
+    def read_feather(cls, path, columns=None):
+        """Read a VCFDataFrame written with to_feather.
+
+        Parameters
+        ----------
+        path: str
+            Path to a Feather file
+        columns: list of str, optional
+            Columns to read, by default every column is read
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            VCF in DataFrame format, with its name and header
+        """
+        return cls._with_metadata(*_read_feather(path, columns))
+
+    def to_parquet(self, path, partition_cols=None):
+        """Write the VCFDataFrame to Parquet.
+
+        The sample name and the VCF header are stored in the file
+        metadata, so read_parquet restores them.
+
+        Parameters
+        ----------
+        path: str
+            Path to the Parquet file, or to the dataset directory when
+            partitioning
+        partition_cols: list of str, optional
+            Columns to partition the dataset by, like ["CHROM"]
+        """
+        _write_parquet(self, path, self.metadata, partition_cols)
+
+    def to_feather(self, path):
+        """Write the VCFDataFrame to Feather, the Arrow IPC file format.
+
+        The sample name and the VCF header are stored in the file
+        metadata, so read_feather restores them.
+
+        Parameters
+        ----------
+        path: str
+            Path to the Feather file
+        """
+        _write_feather(self, path, self.metadata)
+
+    def to_vcf(
+        self,
+        path,
+        compress="bgzip",
+        index=True,
+        threaded=True,
+        chunksize=BATCH_SIZE,
+    ):
+        """Write the VCFDataFrame back to a sites only VCF.
+
+        Meta lines come from the header of the source VCF. INFO fields are
+        packed back from their columns, including the ANN fields, ESP6500
+        frequencies and POLYPHEN, CLINVAR_CLNSIG codes and ZIGOSITY.
+        Derived columns without an INFO definition, like AMINOCHANGE, are
+        not written. Records are sorted by contig, in header order, and
+        position, and rows of one variant holding several annotations are
+        written as a single record.
+
+        Parameters
+        ----------
+        path: str
+            Path of the VCF to write
+        compress: str or None
+            "bgzip" writes a BGZF compressed VCF, None writes plain text
+        index: bool
+            Build a tabix index, it needs compress="bgzip"
+        threaded: bool
+            Write every block in a background thread while the next one
+            is being built
+        chunksize: int
+            Number of records in every written block
+        """
+        header = getattr(self, "header", None)
+        if header is None:
+            raise ValueError(
+                "VCF header not found, read the VCF with read_vcf"
+            )
+        records = self._vcf_records(header)
+        blocks = (
+            "\n".join(chunk) + "\n"
+            for chunk in np.array_split(
+                records.to_numpy(), range(chunksize, len(records), chunksize)
             )
+            if len(chunk)
         )
-        self[numcols] = self[numcols].apply(
-            pd.to_numeric, errors="coerce", axis=1
+        _write_vcf(
+            path, _sites_header(header), blocks, compress, index, threaded
         )
-        self = self.round(round_nums)
-        return self
 
-    def _priorize_annotations(self, pVCF, priority_dict=None):
-        """Priorize annotation with a severity basis."""
-        if "ANN" in self.columns:
-            anndf = self["ANN"]
-            annhead = pVCF.get_header_type("ANN")["Description"].strip(
-                '"Functional annotations: \'"'
+    def _vcf_records(self, header):
+        """Build the sorted VCF record lines, see to_vcf."""
+        info_defs = _header_info(header)
+        vcf_df = self._sort_variants(_header_contigs(header))
+        info_values = {
+            info_id: vcf_df._info_values(info_id, definition)
+            for info_id, definition in info_defs.items()
+        }
+        keys = [vcf_df[k] for k in ["CHROM", "POS", "REF", "ALT"]]
+        first = ~pd.concat(keys, axis=1).duplicated().to_numpy()
+        ann = info_values.get("ANN")
+        if ann is not None and not first.all():
+            info_values["ANN"] = ann.groupby(keys, sort=False).transform(
+                lambda x: ",".join(v for v in x if v)
             )
-            annheaderlist = [x.strip() for x in annhead.split("|")]
-            anndf = anndf.str.split(",", expand=True).stack()
-            anndf = anndf.str.split("|", expand=True)
-            anndf.columns = annheaderlist
-            self.drop(columns="ANN", inplace=True)
-            anndf.index = anndf.index.droplevel(1)
-            self = self.join(anndf, how="inner")
-            del anndf
-            del annhead
-            del annheaderlist
-            if priority_dict is None:
-                IMPACT_SEVERITY = {
-                    "exon_loss_variant": 1,
-                    "frameshift_variant": 2,
-                    "stop_gained": 3,
-                    "stop_lost": 4,
-                    "start_lost": 5,
-                    "splice_acceptor_variant": 6,
-                    "splice_donor_variant": 7,
-                    "disruptive_inframe_deletion": 8,
-                    "inframe_insertion": 9,
-                    "disruptive_inframe_insertion": 10,
-                    "inframe_deletion": 11,
-                    "missense_variant": 12,
-                    "splice_region_variant": 13,
-                    "stop_retained_variant": 14,
-                    "initiator_codon_variant": 15,
-                    "synonymous_variant": 16,
-                    "start_retained": 17,
-                    "coding_sequence_variant": 18,
-                    "5_prime_UTR_variant": 19,
-                    "3_prime_UTR_variant": 20,
-                    "5_prime_UTR_premature_start_codon_gain_variant": 21,
-                    "intron_variant": 22,
-                    "non_coding_exon_variant": 23,
-                    "upstream_gene_variant": 24,
-                    "downstream_gene_variant": 25,
-                    "TF_binding_site_variant": 26,
-                    "regulatory_region_variant": 27,
-                    "intergenic_region": 28,
-                    "transcript": 29,
-                }
+        info = pd.Series("", index=vcf_df.index)
+        for info_id, values in info_values.items():
+            if values is None:
+                continue
+            if info_defs[info_id]["Number"] == "0":
+                info += np.where(
+                    values.isin(["", "False"]), "", ";" + info_id
+                )
             else:
-                IMPACT_SEVERITY = priority_dict
-            self["sorter"] = (
-                self["Annotation"]
-                .str.split("&")
-                .str[0]
-                .replace(IMPACT_SEVERITY)
-            )
-            self.loc[self["HGVS.c"].str.contains("null"), "HGVS.c"] = None
-            self["sorter2"] = [
-                x[0] == x[1] for x in zip(self["ALT"], self["Allele"])
+                info += np.where(
+                    values == "", "", ";" + info_id + "=" + values
+                )
+        id_col = "RSID" if "RSID" in vcf_df.columns else "ID"
+        fields = [
+            _vcf_strings(vcf_df[col])
+            if col in vcf_df.columns
+            else pd.Series("", index=vcf_df.index)
+            for col in ["CHROM", "POS", id_col, "REF", "ALT", "QUAL", "FILTER"]
+        ]
+        fields.append(info.str[1:])
+        fields = [x.replace("", ".") for x in fields]
+        records = fields[0].str.cat(fields[1:], sep="\t")
+        return records[first]
+
+    def _sort_variants(self, contigs):
+        """Sort variants by contig, following contigs, and position."""
+        chroms = self["CHROM"].astype(str)
+        order = {contig: i for i, contig in enumerate(contigs)}
+        for chrom in pd.unique(chroms):
+            order.setdefault(chrom, len(order))
+        codes = chroms.map(order).to_numpy()
+        return self.iloc[np.lexsort((self["POS"].to_numpy(), codes))]
+
+    def _info_values(self, info_id, definition):
+        """Pack the columns of an INFO field back to strings.
+
+        Returns None when the field has no columns to pack.
+        """
+        col = info_id.upper()
+        if col == "CLINVAR_CLNSIG" and col in self.columns:
+            translation = {v: k for k, v in CLINVAR_TRANSLATION.items()}
+            return _translate_tokens(_vcf_strings(self[col]), translation)
+        if col in self.columns:
+            values = _vcf_strings(self[col])
+            if definition["Type"] == "Integer":
+                # Rounding leaves integers formatted as floats
+                values = values.str.replace(r"\.0(?=,|$)", "", regex=True)
+            return values
+        if col == "ANN":
+            return self._pack_ann(definition["Description"])
+        if col == "ESP6500_MAF" and "ESP6500_MAF_EA" in self.columns:
+            maf_cols = ["ESP6500_MAF_EA", "ESP6500_MAF_AA", "ESP6500_MAF_ALL"]
+            mafs = [
+                (pd.to_numeric(self[c], errors="coerce") * 100).round(4)
+                for c in maf_cols
             ]
-            self = self.sort_values(
-                by=["CHROM", "POS", "sorter2", "sorter"],
-                ascending=[True, True, False, True],
-            ).drop_duplicates(["CHROM", "POS", "REF", "ALT"])
-            self.drop(columns=["sorter", "sorter2"], inplace=True)
-            del IMPACT_SEVERITY
-            return self
+            values = _vcf_strings(mafs[0]).str.cat(
+                [_vcf_strings(x) for x in mafs[1:]], sep=","
+            )
+            return values.where(values != ",,", "")
+        if col == "ESP6500_PH" and "POLYPHEN_PRED" in self.columns:
+            pred = _vcf_strings(self["POLYPHEN_PRED"])
+            score = _vcf_strings(self["POLYPHEN_SCORE"])
+            return (pred + ":" + score).where(pred != "", "")
+        if col in ["HOM", "HET"] and "ZIGOSITY" in self.columns:
+            values = np.where(self["ZIGOSITY"] == col, "True", "")
+            return pd.Series(values, index=self.index)
+        return None
+
+    def _pack_ann(self, description):
+        """Join the ANN field columns back to ANN annotations."""
+        columns = list()
+        for field in _ann_fields(description):
+            col = field.upper()
+            if col not in self.columns:
+                col = ANN_RENAMES.get(col)
+            if col not in self.columns:
+                return None
+            columns.append(_vcf_strings(self[col]))
+        ann = columns[0].str.cat(columns[1:], sep="|")
+        return ann.where(ann != "|" * (len(columns) - 1), "")
+
+    @classmethod
+    def iter_vcf(
+        cls,
+        vcf,
+        chunksize=100000,
+        priorize_ann=True,
+        aminochange=True,
+        zigosity=True,
+        parse_ESP=True,
+        parse_CLINVAR=True,
+        round_nums=6,
+        regions=None,
+        panel=None,
+        keep_ann="top",
+        dtypes="str",
+        genotypes=False,
+        pipeline=None,
+        threads=None,
+    ):
+        """Read VCF file in chunks of variants.
+
+        Every chunk goes through the same processing as read_vcf, so
+        whole genome VCFs can be processed in bounded memory. All the
+        alternative alleles and annotations of a VCF record are kept
+        within the same chunk. Every chunk has the columns of all the
+        INFO fields of the header, even the ones no record has, so
+        chunks can be concatenated or written one after the other.
+
+        Parameters
+        ----------
+        vcf: str or file object
+            Path to vcf file or stream, see read_vcf
+        chunksize: int
+            Maximum number of VCF records in each chunk
+        priorize_ann: bool, dict
+            Priorize annotations, receives bool or priorization dict
+        aminochange: bool
+            Calculate AminoChange column
+        zigosity: bool
+            Parse zigosity and map to HOM or HET
+        parse_ESP: bool
+            Parse frequencies in ESP6500 annotations
+        parse_CLINVAR: bool
+            Parse and translate CLINVAR annotation codes
+        round_nums: int or None
+            Round nums to N decimals. None value will stop round method
+        regions: list or str, optional
+            Regions or path to a BED file, see read_vcf
+        panel: str, optional
+            Path to a panel excel file, see read_vcf
+        keep_ann: str
+            Annotations kept when priorizing, see read_vcf
+        dtypes: str
+            "str" or "typed", see read_vcf
+        genotypes: bool or list of str
+            FORMAT fields to read, see read_vcf
+        pipeline: Pipeline, optional
+            Processing stages, see read_vcf
+        threads: int, optional
+            Number of decompression threads, see read_vcf
 
-    def _treat_alt_alleles(self):
-        """Treat cases with two or more alternative alleles."""
-        splitdf = self.loc[self["ALT"].str.contains(",")].copy()
-        if len(splitdf) > 0:
-            ALT = (
-                splitdf["ALT"]
-                .astype(str)
-                .str.split(",", n=1, expand=True)
-                .stack()
-                .rename("ALT")
+        Yields
+        ------
+        vcf_df: VCFDataFrame
+            Chunk of the VCF file in DataFrame format
+        """
+        gene_symbol_list = None if panel is None else _load_panel(panel)
+        for vcf_df, sample_name, pVCF in _iter_vcf(
+            vcf, chunksize, regions, genotypes, threads=threads
+        ):
+            vcf_df = cls._process_vcf(
+                vcf_df,
+                pVCF,
+                priorize_ann=priorize_ann,
+                aminochange=aminochange,
+                zigosity=zigosity,
+                parse_ESP=parse_ESP,
+                parse_CLINVAR=parse_CLINVAR,
+                round_nums=round_nums,
+                gene_symbol_list=gene_symbol_list,
+                keep_ann=keep_ann,
+                pipeline=pipeline,
             )
-            ALT.index = ALT.index.droplevel(-1)
-            ALT = ALT.to_frame()
-            splitdf = splitdf.join(ALT, lsuffix="_x", rsuffix="_y")
-            del ALT
-            splitdf["ALT"] = splitdf["ALT_y"].combine_first(splitdf["ALT_x"])
-            splitdf.drop(columns=["ALT_y", "ALT_x"], inplace=True)
-            splitdf.reset_index(inplace=True)
-            splitdf.drop(columns="index", inplace=True)
-        odd = splitdf.iloc[::2].copy()
-        even = splitdf.iloc[1::2].copy()
-        splitlist = [
-            "ID",
-            "AC",
-            "AF",
-            "SAMPLES_AF",
-            "MLEAC",
-            "MLEAF",
-            "VARTYPE",
-            "dbSNPBuildID",
-        ]
-        splitlist = [x for x in splitlist if x in self.columns]
-        splitlist += [
-            x for x in self.columns if x.startswith(("1000", "CLINVAR"))
+            if len(vcf_df) > 0:
+                yield cls._format_vcf(vcf_df, sample_name, pVCF, dtypes)
+
+    @classmethod
+    def _read_vcf_pieces(
+        cls,
+        vcf,
+        regions,
+        n_jobs,
+        options,
+        genotypes=False,
+        profiler=NO_PROFILER,
+    ):
+        """Parse and process an indexed VCF in parallel genomic ranges.
+
+        The VCF is split in ranges that workers parse and process, with
+        a column for every INFO field of the header so all of them give
+        the same columns. Results come back as Arrow IPC streams and are
+        concatenated in coordinate order, keeping the columns a serial
+        read gives. Workers profile their stages when profiler records,
+        and their records are added to it, so stage times are summed
+        over workers.
+
+        Returns
+        -------
+        vcf_df
+            Processed VCFDataFrame, still to be formatted
+        name
+            Sample Name
+        pVCF
+            cyvcf2.Reader of the VCF
+        """
+        if n_jobs is None or n_jobs == -1:
+            n_jobs = os.cpu_count()
+        vcf_reads, sample_name = _open_vcf(vcf)
+        if regions is not None:
+            regions = _merge_regions(regions, vcf_reads.seqnames)
+        pieces = _split_regions(vcf_reads, regions, n_jobs * 4)
+        previous = [(None, None)] + [(x[0], x[2]) for x in pieces[:-1]]
+        memory = getattr(profiler, "memory", None)
+        serialize = len(pieces) > 1
+        jobs = [
+            (vcf, [x], y, options, genotypes, memory, serialize)
+            for x, y in zip(pieces, previous)
         ]
-        for col in splitlist:
-            odd[col] = odd[col].astype(str).str.split(",", n=1).str[0]
-            even[col] = even[col].apply(
-                lambda x: x
-                if len(str(x).split(",")) <= 1
-                else str(x).split(",", maxsplit=1)[1]
+        results = _run_jobs(_read_pieces_job, jobs, n_jobs)
+        info_found = dict()
+        for _, _, records, keys in results:
+            for record in records:
+                profiler.add(record)
+            info_found.update(dict.fromkeys(keys))
+        results = [(_deserialize_frame(x[0]),) + x[1:] for x in results]
+        non_empty = [x for x in results if len(x[0]) > 0] or results[:1]
+        vcf_df = profiler.run(
+            "concat",
+            pd.concat,
+            [x[0] for x in non_empty],
+            ignore_index=True,
+        )
+        # Header INFO fields missing from the VCF leave out their columns
+        columns = cls._processed_columns(vcf_reads, list(info_found), options)
+        vcf_df = vcf_df[columns].pipe(VCFDataFrame)
+        if genotypes:
+            vcf_df._genotypes = Genotypes.concat([x[1] for x in non_empty])
+        return vcf_df, sample_name, vcf_reads
+
+    @classmethod
+    def _process_vcf(
+        cls,
+        vcf_df,
+        pVCF,
+        priorize_ann=True,
+        aminochange=True,
+        zigosity=True,
+        parse_ESP=True,
+        parse_CLINVAR=True,
+        round_nums=6,
+        gene_symbol_list=None,
+        keep_ann="top",
+        pipeline=None,
+        profiler=NO_PROFILER,
+    ):
+        """Run the stages of a pipeline on a freshly parsed VCF DataFrame.
+
+        Every default stage works row by row, so a VCF processed in
+        several parts gives the same rows as processing it whole. Stages
+        are profiled by profiler.
+        """
+        if pipeline is None:
+            pipeline = DEFAULT_PIPELINE
+        context = dict(
+            pVCF=pVCF,
+            schema=VCFSchema.from_reader(pVCF),
+            priorize_ann=priorize_ann,
+            aminochange=aminochange,
+            zigosity=zigosity,
+            parse_ESP=parse_ESP,
+            parse_CLINVAR=parse_CLINVAR,
+            round_nums=round_nums,
+            gene_symbol_list=gene_symbol_list,
+            keep_ann=keep_ann,
+        )
+        genotypes = vcf_df.attrs.pop("genotypes", None)
+        vcf_df = vcf_df.pipe(VCFDataFrame)
+        if genotypes is not None:
+            # Tracks the VCF record and ALT allele every row comes from
+            vcf_df["_VARIANT"] = np.arange(len(vcf_df))
+        vcf_df = pipeline.run(vcf_df, context, profiler)
+        if genotypes is not None:
+            alleles = vcf_df.pop("_ALLELE") if "_ALLELE" in vcf_df else None
+            vcf_df._genotypes = genotypes.take(
+                vcf_df.pop("_VARIANT").to_numpy(),
+                None if alleles is None else alleles.to_numpy(),
             )
-        splitdf = (
-            pd.concat([odd, even])
-            .sort_index()
-            .replace(to_replace=[r"\(", r"\)"], value="", regex=True)
+        return vcf_df
+
+    @classmethod
+    def _processed_columns(cls, pVCF, info_keys, options):
+        """Get the columns _process_vcf gives a VCF with info_keys found.
+
+        Extra INFO columns without values do not change the others, so
+        VCFs parsed with a column for every header field keep these.
+        """
+        vcf_df = _build_frame([], _info_types(pVCF), info_keys=info_keys)
+        return cls._process_vcf(vcf_df, pVCF, **options).columns
+
+    @classmethod
+    def _format_vcf(cls, vcf_df, sample_name, pVCF, dtypes="str"):
+        """Set the final dtypes of a processed VCF DataFrame.
+
+        With dtypes "str" every value is formatted as string, with "."
+        for missing values. With "typed" see _set_typed_dtypes.
+        """
+        if dtypes == "str":
+            vcf_df.replace(["nan", "", np.nan], ".", inplace=True)
+            vcf_df = vcf_df.astype("str")
+        elif dtypes == "typed":
+            vcf_df = vcf_df._set_typed_dtypes(VCFSchema.from_reader(pVCF))
+        else:
+            raise ValueError('dtypes must be "str" or "typed"')
+        if "POS" in vcf_df.columns:
+            vcf_df["POS"] = vcf_df["POS"].astype(int)
+        genotypes = getattr(vcf_df, "_genotypes", None)
+        vcf_df = cls._with_metadata(
+            vcf_df, dict(name=sample_name, header=pVCF.raw_header)
         )
-        del odd, even
-        splitdf = splitdf[["CHROM", "POS", "REF", "ALT"] + splitlist]
-        self = self.merge(splitdf, on=["CHROM", "POS", "REF"], how="left")
-        splitlist.append("ALT")
-        xlist = [x + "_x" for x in splitlist]
-        ylist = [y + "_y" for y in splitlist]
-        del splitdf  # ya no uso más splitdf así que lo borro
-        for col in splitlist:
-            self[col] = self[col + "_y"].combine_first(self[col + "_x"])
-        del splitlist  # ya no uso más splitlist
-        self.drop(columns=xlist + ylist, inplace=True)
-        del xlist, ylist  # ya no uso más esto.
-        self["POS"] = self["POS"].astype(int)
+        if genotypes is not None:
+            genotypes.index = vcf_df.index
+            vcf_df._genotypes = genotypes
+        return vcf_df
+
+    def _set_typed_dtypes(self, schema):
+        """Convert columns to numeric, bool and categorical dtypes.
+
+        Numeric INFO fields become float64, or nullable Int64 for
+        Integer fields holding whole numbers, flags become bool and the
+        columns in CATEGORICAL_COLUMNS become categoricals. Empty strings
+        are turned into NaN.
+        """
+        info_types = schema.column_types
+        for col in self.columns:
+            col_type = info_types.get(col)
+            if col_type in ["Integer", "Float"] or col in NUMERIC_COLUMNS:
+                values = pd.to_numeric(self[col], errors="coerce")
+                if col_type == "Integer" and (
+                    values.dropna() % 1 == 0
+                ).all():
+                    values = values.astype("Int64")
+                self[col] = values
+            elif col_type == "Flag":
+                self[col] = self[col].fillna(False).astype(bool)
+            elif col in CATEGORICAL_COLUMNS:
+                self[col] = self[col].replace("", np.nan).astype("category")
+            elif self[col].dtype == object:
+                self[col] = self[col].replace("", np.nan)
         return self
 
-    def _calc_aminochange(self):
-        if "HGVS.P" in self.columns:
-            self["AMINOCHANGE"] = self["HGVS.P"].apply(self._aminochange)
+    def _round_num_cols(self, schema, round_nums):
+        numcols = schema.numeric_columns + [
+            "ESP6500_MAF_EA",
+            "ESP6500_MAF_AA",
+            "ESP6500_MAF_ALL",
+        ]
+        numcols = list(self.columns.intersection(numcols))
+        # Numeric columns are floats whatever columns are rounded, which
+        # the former row by row conversion only gave when some were floats
+        self[numcols] = (
+            self[numcols].apply(pd.to_numeric, errors="coerce").astype(float)
+        )
+        # Rounded in place, the same as round, without copying the frame
+        numeric = self.select_dtypes("number").columns
+        self[numeric] = self[numeric].round(round_nums)
+        return self
 
-    @classmethod
-    def _aminochange(cls, value):
-        """Calculate if there is a change in aminoacids, from HGVS.P."""
-        try:
-            value = value.replace("p.", "")
-            if value[:3] != value[-3:]:
-                return "CHANGE"
-            else:
-                return "."
-        except TypeError:
-            return "."
+    def _filter_panel_variants(self, schema, gene_symbol_list):
+        """Drop annotations on genes out of the panel and unannotated rows.
+
+        Gene names are extracted from the raw ANN strings, so this runs
+        before annotations are exploded to one row each, and ANN keeps
+        only the annotations on panel genes whatever priorize_ann is.
+        """
+        if "ANN" not in self.columns:
+            return self
+        gene_idx = schema.ann_fields.index("Gene_Name")
+        pattern = r"^" + r"[^|]*\|" * gene_idx + r"([^|]*)"
+        annotations = self["ANN"].str.split(",").explode()
+        genes = annotations.str.extract(pattern, expand=False)
+        annotations = annotations[genes.isin(gene_symbol_list).to_numpy()]
+        ann = annotations.groupby(level=0).agg(",".join)
+        return self.loc[self.index.isin(ann.index)].assign(ANN=ann)
 
     @classmethod
-    def _divide(cls, x, y):
-        """Divide x on y, needed for dividing freqs.
+    def _select_annotations(
+        cls, ann, alt, fields, severity, keep="top", gene_symbol_list=None
+    ):
+        """Walk every ANN string once keeping only the chosen annotations.
+
+        Annotations whose Allele matches the row ALT are preferred, then
+        the lowest severity value of their first Annotation term. Ties
+        keep the first annotation listed.
 
         Parameters
         ----------
-        x
-            The dividend
-        y
-            The divisor
-        Returns result or x.
+        ann
+            Iterable of raw ANN strings, one per row.
+        alt
+            Iterable of ALT alleles, one per row.
+        fields
+            ANN field names, the ann_fields of the VCFSchema.
+        severity
+            Dict mapping annotation terms to severity, lower is worse.
+        keep
+            "top" keeps one annotation per row, "gene" the top annotation
+            of every gene and "all" keeps every annotation.
+        gene_symbol_list
+            If given, annotations on other genes are discarded.
+
+        Returns
+        -------
+        rows
+            Position of the row each kept annotation belongs to
+        annotations
+            List with the fields of each kept annotation
+        """
+        if keep not in ["top", "gene", "all"]:
+            raise ValueError('keep must be "top", "gene" or "all"')
+        n_fields = len(fields)
+        allele_idx = fields.index("Allele")
+        effect_idx = fields.index("Annotation")
+        gene_idx = fields.index("Gene_Name")
+        if gene_symbol_list is not None:
+            gene_symbol_list = set(gene_symbol_list)
+        unknown = max(severity.values(), default=0) + 1
+        rows = list()
+        annotations = list()
+        for row, (value, allele) in enumerate(zip(ann, alt)):
+            if not isinstance(value, str):
+                continue
+            best = dict()
+            for annotation in value.split(","):
+                annotation = annotation.split("|")
+                if len(annotation) != n_fields:
+                    annotation = (annotation + [None] * n_fields)[:n_fields]
+                gene = annotation[gene_idx]
+                if gene_symbol_list is not None and (
+                    gene not in gene_symbol_list
+                ):
+                    continue
+                if keep == "all":
+                    rows.append(row)
+                    annotations.append(annotation)
+                    continue
+                rank = (
+                    annotation[allele_idx] != allele,
+                    severity.get(
+                        str(annotation[effect_idx]).split("&")[0], unknown
+                    ),
+                )
+                key = gene if keep == "gene" else None
+                if key not in best or rank < best[key][0]:
+                    best[key] = (rank, annotation)
+            for _, annotation in best.values():
+                rows.append(row)
+                annotations.append(annotation)
+        return rows, annotations
+
+    def _priorize_annotations(
+        self, schema, priority_dict=None, gene_symbol_list=None, keep="top"
+    ):
+        """Priorize annotation with a severity basis.
+
+        ANN is replaced by one column per ANN field holding the kept
+        annotations, see _select_annotations. Rows without any kept
+        annotation are dropped.
         """
-        try:
-            return float(x) / y
-        except ValueError:
-            return x
-        except TypeError:
-            return x
-        except ZeroDivisionError:
-            return x
+        if "ANN" in self.columns:
+            annheaderlist = schema.ann_fields
+            if priority_dict is None:
+                priority_dict = IMPACT_SEVERITY
+            rows, annotations = self._select_annotations(
+                self["ANN"],
+                self["ALT"],
+                annheaderlist,
+                priority_dict,
+                keep,
+                gene_symbol_list,
+            )
+            anndf = pd.DataFrame(annotations, columns=annheaderlist)
+            del annotations
+            self = self.drop(columns="ANN").iloc[rows]
+            self.reset_index(drop=True, inplace=True)
+            self = pd.concat([self, anndf], axis=1).pipe(VCFDataFrame)
+            del anndf
+            self.loc[
+                self["HGVS.c"].str.contains("null", na=False), "HGVS.c"
+            ] = None
+        return self
+
+    def _treat_alt_alleles(self, schema):
+        """Split variants with N alternative alleles into N rows.
+
+        Rows are repeated once per ALT allele and every per-allele column
+        keeps the value of its allele: the i-th value for Number=A and
+        the REF value plus the i-th ALT value for Number=R. Values that do
+        not have one entry per allele are kept whole on every row.
+        Per-allele columns are placed after the rest, followed by ALT.
+        """
+        allele_cols = schema.allele_columns(self.columns)
+        n_alt = (self["ALT"].str.count(",") + 1).to_numpy()
+        multi = n_alt > 1
+        if multi.any():
+            counts = n_alt[multi]
+            split_rows = np.repeat(multi, n_alt)
+            alleles = self.loc[multi]
+            self = self.take(np.repeat(np.arange(len(self)), n_alt))
+            self.reset_index(drop=True, inplace=True)
+            self.loc[split_rows, "ALT"] = (
+                alleles["ALT"].str.split(",").explode().to_numpy()
+            )
+            for col, number in allele_cols.items():
+                if alleles[col].dtype != object:
+                    continue
+                parts = alleles[col].str.split(",")
+                n_parts = parts.str.len().to_numpy()
+                if number == "R":
+                    ok = n_parts == counts + 1
+                    values = (
+                        parts[ok].str[0].repeat(counts[ok])
+                        + ","
+                        + parts[ok].str[1:].explode()
+                    )
+                else:
+                    ok = n_parts == counts
+                    values = parts[ok].explode()
+                if not ok.any():
+                    continue
+                col_values = self[col].to_numpy(copy=True)
+                split_values = col_values[split_rows]
+                split_values[np.repeat(ok, counts)] = values.to_numpy()
+                col_values[split_rows] = split_values
+                self[col] = col_values
+        if "_VARIANT" in self.columns:
+            starts = np.repeat(np.cumsum(n_alt) - n_alt, n_alt)
+            self["_ALLELE"] = np.arange(n_alt.sum()) - starts
+        last_cols = list(allele_cols) + ["ALT"]
+        first_cols = [x for x in self.columns if x not in last_cols]
+        self = self[first_cols + last_cols]
+        self["POS"] = self["POS"].astype(int)
+        return self
+
+    def _calc_aminochange(self):
+        if "HGVS.P" in self.columns:
+            self["AMINOCHANGE"] = _map_unique(
+                self["HGVS.P"], self._aminochange
+            )
+
+    @classmethod
+    def _aminochange(cls, values):
+        """Calculate if there is a change in aminoacids, from HGVS.P.
+
+        Values are "CHANGE" when the first and last three letters of
+        HGVS.P, without "p.", differ and "." otherwise or if missing.
+        """
+        is_str = values.map(type) == str
+        values = values.where(is_str, "").str.replace("p.", "", regex=False)
+        change = is_str & (values.str[:3] != values.str[-3:])
+        return np.where(change, "CHANGE", ".")
 
     def _map_zigosity(self):
         """Map HET and HOM in ZIGOSIS columns."""
@@ -279,30 +1287,31 @@ class VCFDataFrame(pd.DataFrame):
             self["HOM"] = self["HOM"].replace(
                 {True: "HOM", np.nan: "HET", None: "HET"}
             )
-            self.drop(columns="HET", inplace=True)
+            self.drop(columns="HET", errors="ignore", inplace=True)
             self.rename(columns={"HOM": "ZIGOSITY"}, inplace=True)
         return self
 
     def _process_ESP6500(self):
         """Calculate frequencies on ESP6500 populations and POLYPHEN Score."""
         if "ESP6500_MAF" in self.columns:
-            self[
-                ["ESP6500_MAF_EA", "ESP6500_MAF_AA", "ESP6500_MAF_ALL"]
-            ] = self["ESP6500_MAF"].str.split(",", expand=True)
-            self["ESP6500_MAF_EA"] = self["ESP6500_MAF_EA"].apply(
-                self._divide, args=(100,)
-            )
-            self["ESP6500_MAF_AA"] = self["ESP6500_MAF_AA"].apply(
-                self._divide, args=(100,)
-            )
-            self["ESP6500_MAF_ALL"] = self["ESP6500_MAF_ALL"].apply(
-                self._divide, args=(100,)
+            mafs = (
+                self["ESP6500_MAF"]
+                .str.split(",", expand=True)
+                .reindex(columns=range(3))
             )
+            maf_cols = ["ESP6500_MAF_EA", "ESP6500_MAF_AA", "ESP6500_MAF_ALL"]
+            for i, col in enumerate(maf_cols):
+                # Percentages become frequencies, other values are kept
+                values = pd.to_numeric(mafs[i], errors="coerce") / 100
+                self[col] = values.where(values.notna(), mafs[i])
             self.drop(columns=["ESP6500_MAF"], inplace=True)
         if "ESP6500_PH" in self.columns:
-            self[["POLYPHEN_PRED", "POLYPHEN_SCORE"]] = self[
-                "ESP6500_PH"
-            ].str.split(":", 1, expand=True)
+            self[["POLYPHEN_PRED", "POLYPHEN_SCORE"]] = (
+                self["ESP6500_PH"]
+                .str.split(":", 1, expand=True)
+                .reindex(columns=range(2))
+                .astype(object)
+            )
             self["POLYPHEN_PRED"] = (
                 self["POLYPHEN_PRED"].str.strip(".").str.strip(".,")
             )
@@ -310,39 +1319,34 @@ class VCFDataFrame(pd.DataFrame):
                 self["POLYPHEN_SCORE"].str.split(",").str[0]
             )
             self.drop(columns=["ESP6500_PH"], inplace=True)
-            self.rename(
-                columns={
-                    "ANNOTATION": "EFFECT",
-                    "ANNOTATION_IMPACT": "IMPACT",
-                    "ID": "RSID",
-                },
-                inplace=True,
-            )
+        return self
+
+    def _rename_columns(self):
+        """Rename the ANN effect and impact columns and ID."""
+        self.rename(
+            columns={
+                "ANNOTATION": "EFFECT",
+                "ANNOTATION_IMPACT": "IMPACT",
+                "ID": "RSID",
+            },
+            inplace=True,
+        )
         return self
 
     def _process_CLINVAR(self):
-        """Process and translate CLINVAR data."""
+        """Translate every CLINVAR_CLNSIG code, see _translate_tokens."""
         if "CLINVAR_CLNSIG" in self.columns:
-            clinvartranslation = {
-                "255": "other",
-                "0": "Uncertain significance",
-                "1": "not provided",
-                "2": "Benign",
-                "3": "Likely Benign",
-                "4": "Likely pathogenic",
-                "5": "Pathogenic",
-                "6": "drug response",
-                "7": "histocompatibility",
-            }
-            for k, v in clinvartranslation.items():
-                self["CLINVAR_CLNSIG"] = self["CLINVAR_CLNSIG"].str.replace(
-                    k, v
-                )
+            self["CLINVAR_CLNSIG"] = _translate_tokens(
+                self["CLINVAR_CLNSIG"], CLINVAR_TRANSLATION
+            )
         return self
 
     def panel(self, panel):
         """Extract variants defined in an excel file.
 
+        Variants are selected in a single pass over GENE_NAME and
+        returned grouped by gene, following the order of the panel.
+
         Parameters
         ----------
         panel: str
@@ -353,12 +1357,87 @@ class VCFDataFrame(pd.DataFrame):
         panel_df: VCFDataFrame
            Dataframe consisting of filtered variants.
         """
-        panel_df = pd.DataFrame()
         gene_symbol_list = _load_panel(panel)
-        for gene in gene_symbol_list:
-            panel_df = panel_df.append(self.loc[self["GENE_NAME"] == gene])
+        gene_order = pd.Series(
+            range(len(gene_symbol_list)), index=gene_symbol_list
+        )
+        rows = np.flatnonzero(self["GENE_NAME"].isin(gene_order.index))
+        order = self["GENE_NAME"].iloc[rows].map(gene_order).to_numpy()
+        # Selected by position, as the index of merged chunks repeats
+        panel_df = self.iloc[rows[np.argsort(order, kind="stable")]]
         panel_df = panel_df.pipe(VCFDataFrame)
         panel_df.name = self.name
         if len(panel_df) < 1:
             raise RuntimeError("Panel Result is empty")
         return panel_df
+
+    def annotate(self, reference, columns=None, prefix=""):
+        """Add the columns of a reference table to the matching variants.
+
+        Variants are matched on CHROM, POS, REF and ALT. The reference is
+        read region by region around the variants of the VCFDataFrame,
+        using its index, so only the contigs, rows and columns needed are
+        loaded. Multiallelic VCF records are split in one row per ALT
+        allele before matching.
+
+        Parameters
+        ----------
+        reference: str
+            Parquet file or dataset, sorted by CHROM and POS, bgzipped
+            VCF or BCF with an index, or bgzipped tab separated table
+            indexed with tabix with a "#" header line naming its
+            columns. Every table needs CHROM, POS, REF and ALT columns
+        columns: list of str, optional
+            Reference columns, or INFO IDs of a VCF, to add. By default
+            all of them
+        prefix: str
+            Prefix of the added column names, columns with the same name
+            are replaced
+
+        Returns
+        -------
+        annotated_df: VCFDataFrame
+            Copy of the VCFDataFrame with the reference columns added,
+            missing for variants not in the reference
+        """
+        chroms = self["CHROM"].astype(str).to_numpy()
+        regions, region_rows = _reference_windows(chroms, self["POS"])
+        keys = pd.MultiIndex.from_arrays(
+            [
+                chroms,
+                self["POS"].to_numpy(dtype=np.int64),
+                self["REF"].astype(str).to_numpy(),
+                self["ALT"].astype(str).to_numpy(),
+            ]
+        )
+        matched = list()
+        for rows, (ref_df, vcf_reads) in zip(
+            region_rows, _iter_reference(reference, regions, columns)
+        ):
+            if vcf_reads is not None:
+                ref_df = ref_df.pipe(VCFDataFrame)._treat_alt_alleles(
+                    VCFSchema.from_reader(vcf_reads)
+                )
+            if columns is None:
+                columns = [x for x in ref_df.columns if x not in VARIANT_KEYS]
+            ref_keys = pd.MultiIndex.from_arrays(
+                [
+                    ref_df["CHROM"].astype(str).to_numpy(),
+                    ref_df["POS"].to_numpy(dtype=np.int64),
+                    ref_df["REF"].astype(str).to_numpy(),
+                    ref_df["ALT"].astype(str).to_numpy(),
+                ]
+            )
+            # The first reference row of every variant is kept
+            unique = ~ref_keys.duplicated()
+            found = ref_keys[unique].get_indexer(keys[rows])
+            hits = found >= 0
+            values = ref_df.loc[unique, columns].iloc[found[hits]]
+            matched.append(values.set_axis(rows[hits], axis=0))
+        annotations = pd.concat(
+            matched or [pd.DataFrame(columns=columns or [])]
+        ).reindex(range(len(self)))
+        annotated_df = self.copy()
+        for col in annotations.columns:
+            annotated_df[prefix + col] = annotations[col].to_numpy()
+        return annotated_df
@@ -1,5 +1,5 @@
 """Init Module for MODAPy-VCFDataFrame."""
+__version__ = "0.0.1"
+
 from VCFDataFrame.VCFDataFrame import VCFDataFrame # noqa
 # from .io import _load_vcf
-
-__version__ = "0.0.1"
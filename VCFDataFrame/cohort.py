@@ -0,0 +1,163 @@
+"""Merge of many samples in a variant by sample zigosity matrix."""
+from VCFDataFrame.genotypes import HET as GT_HET, HOM_ALT as GT_HOM_ALT
+
+import numpy as np
+
+import pandas as pd
+
+# Codes of the sample columns of a merged cohort
+ABSENT = 0
+HET = 1
+HOM = 2
+CARRIER = 3
+
+
+def _reduce_frame(vcf_df):
+    """Reduce a VCFDataFrame to compact integer variant and sample codes.
+
+    Variants are coded by contig, POS and REF/ALT pair, with the contig
+    and allele strings stored once. Samples are taken from the genotypes
+    when they were read, otherwise the frame is a single sample coded
+    from ZIGOSITY, or as CARRIER without it.
+
+    Returns
+    -------
+    reduced: tuple
+        contigs, contig names, positions, alleles, allele names, sample
+        names and a variants x samples int8 array of codes
+    """
+    contigs, contig_names = pd.factorize(vcf_df["CHROM"].astype(str))
+    alleles, allele_names = pd.factorize(
+        vcf_df["REF"].astype(str) + "\t" + vcf_df["ALT"].astype(str)
+    )
+    positions = vcf_df["POS"].to_numpy(dtype=np.int64)
+    genotypes = getattr(vcf_df, "_genotypes", None)
+    if genotypes is not None:
+        gt_types = genotypes.align(vcf_df.index).gt_types
+        codes = np.select(
+            [gt_types == GT_HET, gt_types == GT_HOM_ALT], [HET, HOM], ABSENT
+        )
+        samples = genotypes.samples
+    else:
+        codes = np.full(len(vcf_df), CARRIER)
+        if "ZIGOSITY" in vcf_df.columns:
+            zigosity = vcf_df["ZIGOSITY"].astype(str).to_numpy()
+            codes[zigosity == "HET"] = HET
+            codes[zigosity == "HOM"] = HOM
+        codes = codes[:, None]
+        samples = [getattr(vcf_df, "name", None)]
+    return (
+        contigs.astype(np.int32),
+        list(contig_names),
+        positions,
+        alleles.astype(np.int32),
+        list(allele_names),
+        list(samples),
+        codes.astype(np.int8),
+    )
+
+
+def _recode(names, index):
+    """Map local codes to the codes of a growing global index."""
+    return np.array(
+        [index.setdefault(name, len(index)) for name in names],
+        dtype=np.int32,
+    )
+
+
+def _merge_reduced(reduced):
+    """Merge reduced frames, see _reduce_frame, in a cohort matrix.
+
+    Every carried variant of every sample becomes a (variant, sample,
+    code) entry. Entries are sorted once by contig, position, allele and
+    sample, variants are numbered where the key changes and every sample
+    column is filled from its entries.
+
+    Returns
+    -------
+    variants: dict
+        CHROM, POS, REF, ALT and count columns
+    columns: dict
+        Sample names mapped to sparse int8 arrays
+    """
+    contig_index = dict()
+    allele_index = dict()
+    samples = list()
+    keys = list()
+    for part in reduced:
+        contigs, contig_names, positions, alleles, allele_names = part[:5]
+        contigs = _recode(contig_names, contig_index)[contigs]
+        alleles = _recode(allele_names, allele_index)[alleles]
+        for column, sample in enumerate(part[5]):
+            if sample is None:
+                sample = f"SAMPLE{len(samples) + 1}"
+            if sample in samples:
+                raise ValueError(f"Sample {sample} found more than once")
+            codes = part[6][:, column]
+            carried = codes != ABSENT
+            keys.append(
+                (
+                    contigs[carried],
+                    positions[carried],
+                    alleles[carried],
+                    np.full(carried.sum(), len(samples), dtype=np.int32),
+                    codes[carried],
+                )
+            )
+            samples.append(sample)
+    contigs, positions, alleles, owners, codes = (
+        np.concatenate([x[i] for x in keys]) if keys else np.array([], int)
+        for i in range(5)
+    )
+    # Alleles are sorted as strings, contigs in order of appearance
+    allele_names = np.array(list(allele_index), dtype=object)
+    allele_rank = np.empty(len(allele_names), dtype=np.int32)
+    allele_rank[np.argsort(allele_names, kind="stable")] = np.arange(
+        len(allele_names)
+    )
+    alleles = allele_rank[alleles] if len(alleles) else alleles
+    order = np.lexsort((owners, alleles, positions, contigs))
+    contigs, positions, alleles = (
+        contigs[order],
+        positions[order],
+        alleles[order],
+    )
+    owners, codes = owners[order], codes[order]
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = (
+        (contigs[1:] != contigs[:-1])
+        | (positions[1:] != positions[:-1])
+        | (alleles[1:] != alleles[:-1])
+    )
+    variant_ids = np.cumsum(new) - 1
+    # Frames with several rows per variant, like keep_ann="all", count once
+    repeated = np.zeros(len(order), dtype=bool)
+    repeated[1:] = ~new[1:] & (owners[1:] == owners[:-1])
+    variant_ids, owners, codes = (
+        variant_ids[~repeated],
+        owners[~repeated],
+        codes[~repeated],
+    )
+    n_variants = int(new.sum())
+    ref_alt = pd.Series(np.sort(allele_names)[alleles[new]]).str.split(
+        "\t", n=1, expand=True
+    )
+    variants = dict(
+        CHROM=np.array(list(contig_index), dtype=object)[contigs[new]],
+        POS=positions[new],
+        REF=ref_alt[0].to_numpy() if n_variants else [],
+        ALT=ref_alt[1].to_numpy() if n_variants else [],
+        N_SAMPLES=np.bincount(variant_ids, minlength=n_variants),
+        N_HET=np.bincount(variant_ids[codes == HET], minlength=n_variants),
+        N_HOM=np.bincount(variant_ids[codes == HOM], minlength=n_variants),
+    )
+    columns = dict()
+    by_sample = np.argsort(owners, kind="stable")
+    bounds = np.searchsorted(owners[by_sample], np.arange(len(samples) + 1))
+    for column, sample in enumerate(samples):
+        first, last = bounds[column], bounds[column + 1]
+        entries = by_sample[first:last]
+        values = np.zeros(n_variants, dtype=np.int8)
+        values[variant_ids[entries]] = codes[entries]
+        columns[sample] = pd.arrays.SparseArray(values, fill_value=ABSENT)
+    return variants, columns
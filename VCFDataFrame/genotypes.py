@@ -0,0 +1,258 @@
+"""Per sample FORMAT fields stored as dense NumPy arrays."""
+import numpy as np
+
+import pandas as pd
+
+# Genotype codes, the same used by cyvcf2 gt_types
+HOM_REF = 0
+HET = 1
+UNKNOWN = 2
+HOM_ALT = 3
+
+ZIGOSITY_LABELS = np.array(["HOM_REF", "HET", None, "HOM"], dtype=object)
+
+# cyvcf2 missing and vector end values of Integer fields
+INT_MISSING = -2147483647
+
+
+class Genotypes:
+    """Genotypes and FORMAT fields of a VCFDataFrame.
+
+    Every array has one row per variant and one column per sample.
+    Fields with several values per sample, like AD, add a third axis.
+    Integer fields are stored as int32 with -1 for missing values, Float
+    fields as float32 with NaN and String fields as objects.
+
+    Parameters
+    ----------
+    samples: list of str
+        Sample names, in VCF order
+    alleles: np.ndarray
+        GT alleles, variants x samples x ploidy. 0 is REF, 1 the ALT of
+        the row and 2 any other ALT, with -1 for missing alleles and -2
+        padding lower ploidies
+    fields: dict
+        FORMAT IDs mapped to their arrays
+    numbers: dict
+        FORMAT IDs mapped to their header Number
+    index: pd.Index, optional
+        Labels of the VCFDataFrame rows the arrays belong to
+    """
+
+    def __init__(self, samples, alleles, fields, numbers, index=None):
+        self.samples = list(samples)
+        self.alleles = alleles
+        self.fields = fields
+        self.numbers = numbers
+        if index is None:
+            index = pd.RangeIndex(len(alleles))
+        self.index = index
+
+    def __len__(self):
+        """Get the number of variants."""
+        return len(self.alleles)
+
+    def __getitem__(self, field):
+        """Get the array of a FORMAT field."""
+        if field == "GT":
+            return self.alleles
+        return self.fields[field]
+
+    @property
+    def gt_types(self):
+        """Genotype codes, HOM_REF, HET, UNKNOWN or HOM_ALT.
+
+        Codes count the copies of the ALT allele of every row, so a 1/2
+        genotype is HET on the rows of both ALT alleles.
+        """
+        ploidy = (self.alleles != -2).sum(axis=-1)
+        called = (self.alleles >= 0).sum(axis=-1)
+        alt = (self.alleles == 1).sum(axis=-1)
+        gt_types = np.full(alt.shape, HET, dtype=np.int8)
+        gt_types[alt == 0] = HOM_REF
+        gt_types[alt == ploidy] = HOM_ALT
+        gt_types[(called < ploidy) | (ploidy == 0)] = UNKNOWN
+        return gt_types
+
+    def zigosity(self):
+        """Get the zigosity of every sample, HOM, HET, HOM_REF or None.
+
+        Returns
+        -------
+        zigosity: pd.DataFrame
+            One row per variant and one column per sample
+        """
+        return pd.DataFrame(
+            ZIGOSITY_LABELS[self.gt_types],
+            index=self.index,
+            columns=self.samples,
+        )
+
+    def to_frame(self, field):
+        """Get a FORMAT field with a single value per sample as DataFrame.
+
+        Parameters
+        ----------
+        field: str
+            FORMAT ID, like DP or GQ
+
+        Returns
+        -------
+        values: pd.DataFrame
+            One row per variant and one column per sample
+        """
+        values = self.fields[field]
+        if values.ndim != 2:
+            raise ValueError(f"{field} has several values per sample")
+        return pd.DataFrame(values, index=self.index, columns=self.samples)
+
+    def take(self, rows, alleles=None):
+        """Select rows, keeping the values of one ALT allele per row.
+
+        Parameters
+        ----------
+        rows: np.ndarray
+            Positions of the rows to take
+        alleles: np.ndarray, optional
+            ALT allele number, starting at 0, kept for every taken row.
+            GT is recoded so 1 is that allele and 2 any other ALT, and
+            Number=A and R fields keep the values of that allele only
+
+        Returns
+        -------
+        genotypes: Genotypes
+            Genotypes of the taken rows
+        """
+        taken = self.alleles[rows]
+        fields = {field: values[rows] for field, values in self.fields.items()}
+        if alleles is not None:
+            alt = (alleles + 1)[:, None, None]
+            taken = np.where(taken > 0, np.where(taken == alt, 1, 2), taken)
+            taken = taken.astype(self.alleles.dtype)
+            for field, values in fields.items():
+                number = self.numbers[field]
+                if number not in ["A", "R"] or values.ndim != 3:
+                    continue
+                width = values.shape[2]
+                if number == "A":
+                    columns = alleles[:, None]
+                else:
+                    columns = np.stack(
+                        [np.zeros_like(alleles), alleles + 1], axis=1
+                    )
+                columns = np.minimum(columns, width - 1)
+                fields[field] = np.take_along_axis(
+                    values, columns[:, None, :], axis=2
+                )
+                if number == "A":
+                    fields[field] = fields[field][:, :, 0]
+        return Genotypes(self.samples, taken, fields, self.numbers)
+
+    def align(self, index):
+        """Select the rows with the given labels, in that order."""
+        if self.index.equals(index):
+            return self
+        rows = self.index.get_indexer(index)
+        if (rows < 0).any():
+            raise KeyError("rows without genotypes in the VCFDataFrame")
+        genotypes = self.take(rows)
+        genotypes.index = index
+        return genotypes
+
+    @classmethod
+    def concat(cls, genotypes):
+        """Concatenate the rows of several Genotypes of the same samples."""
+        first = genotypes[0]
+        ploidy = max(x.alleles.shape[2] for x in genotypes)
+        alleles = np.concatenate(
+            [_pad(x.alleles, ploidy, -2) for x in genotypes]
+        )
+        fields = dict()
+        for field, values in first.fields.items():
+            arrays = [x.fields[field] for x in genotypes]
+            if values.ndim == 3:
+                width = max(x.shape[2] for x in arrays)
+                arrays = [_pad(x, width, _missing(x.dtype)) for x in arrays]
+            fields[field] = np.concatenate(arrays)
+        return cls(first.samples, alleles, fields, first.numbers)
+
+
+class _GenotypeBuffer:
+    """Collects genotypes and FORMAT fields while reading variants."""
+
+    def __init__(self, samples, format_types):
+        self.samples = samples
+        self.format_types = format_types
+        self.alleles = []
+        self.values = {field: [] for field in format_types}
+
+    def add(self, variant):
+        # The last column holds the phased flag
+        self.alleles.append(variant.genotype.array()[:, :-1])
+        for field, values in self.values.items():
+            values.append(variant.format(field))
+
+    def to_genotypes(self):
+        n_samples = len(self.samples)
+        ploidy = max((x.shape[1] for x in self.alleles), default=2)
+        alleles = np.full(
+            (len(self.alleles), n_samples, ploidy), -2, dtype=np.int16
+        )
+        for row, values in enumerate(self.alleles):
+            alleles[row, :, : values.shape[1]] = values
+        self.alleles = []
+        fields = dict()
+        numbers = dict()
+        for field, values in self.values.items():
+            field_type, number = self.format_types[field]
+            numbers[field] = number
+            fields[field] = _stack_format(
+                values, field_type, number, n_samples
+            )
+        return Genotypes(self.samples, alleles, fields, numbers)
+
+
+def _missing(dtype):
+    """Missing value used for arrays of dtype."""
+    if np.issubdtype(dtype, np.integer):
+        return -1
+    if np.issubdtype(dtype, np.floating):
+        return np.nan
+    return None
+
+
+def _pad(values, width, fill):
+    """Pad the third axis of values up to width."""
+    if values.shape[2] >= width:
+        return values
+    padded = np.full(values.shape[:2] + (width,), fill, dtype=values.dtype)
+    padded[:, :, : values.shape[2]] = values
+    return padded
+
+
+def _stack_format(values, field_type, number, n_samples):
+    """Stack the per variant arrays of a FORMAT field in a dense array."""
+    if field_type == "Integer":
+        dtype = np.int32
+    elif field_type == "Float":
+        dtype = np.float32
+    else:
+        dtype = object
+    # String fields come as one string per sample, without a second axis
+    values = [
+        x.reshape(n_samples, -1) if x is not None and x.ndim == 1 else x
+        for x in values
+    ]
+    width = max((x.shape[1] for x in values if x is not None), default=1)
+    array = np.full((len(values), n_samples, width), _missing(dtype), dtype)
+    for row, value in enumerate(values):
+        if value is None:
+            continue
+        if dtype == np.int32:
+            value = np.where(value <= INT_MISSING, -1, value)
+        elif dtype == object:
+            value = value.astype(str).astype(object)
+        array[row, :, : value.shape[1]] = value
+    if number == "1":
+        array = array[:, :, 0]
+    return array
@@ -0,0 +1,199 @@
+"""Genomic interval index and region queries of VCFDataFrame rows."""
+from VCFDataFrame.io import _load_bed, _parse_region
+
+import numpy as np
+
+import pandas as pd
+
+# End of whole contig queries
+CONTIG_END = np.iinfo(np.int64).max
+
+
+def _spans(lo, hi):
+    """Concatenate the ranges lo[i]:hi[i], with the range each comes from.
+
+    Returns
+    -------
+    positions
+        Every position of every range
+    owners
+        Range each position belongs to
+    """
+    counts = np.maximum(hi - lo, 0)
+    owners = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    return lo[owners] + offsets, owners
+
+
+class LocusIndex:
+    """Variant positions of every contig, sorted for binary searches.
+
+    Variants span from their POS to the last base of their REF, and
+    intervals are 1-based and inclusive. The variants of a contig are
+    grouped by the bit length of their span, so a long REF or SV only
+    widens the searches among the few variants about as long as it.
+
+    Parameters
+    ----------
+    chroms: array-like
+        Contig of every variant
+    starts: np.ndarray
+        POS of every variant
+    ends: np.ndarray
+        Last position of every variant
+    """
+
+    def __init__(self, chroms, starts, ends):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        codes, contigs = pd.factorize(np.asarray(chroms, dtype=object))
+        levels = np.frexp(np.maximum(ends - starts, 0))[1]
+        order = np.lexsort((starts, levels, codes))
+        codes, levels = codes[order], levels[order]
+        new = np.flatnonzero(
+            (codes[1:] != codes[:-1]) | (levels[1:] != levels[:-1])
+        )
+        bounds = np.concatenate([[0], new + 1, [len(order)]])
+        self.contigs = dict()
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            rows = order[first:last]
+            # Longest distance from a variant start to its end
+            reach = int((ends[rows] - starts[rows]).max())
+            self.contigs.setdefault(contigs[codes[first]], []).append(
+                (starts[rows], ends[rows], rows, reach)
+            )
+
+    def locate(self, chroms, starts, ends):
+        """Find the variants overlapping any of the given intervals.
+
+        Parameters
+        ----------
+        chroms: array-like
+            Contig of every interval
+        starts, ends: np.ndarray
+            First and last position of every interval, 1-based
+
+        Returns
+        -------
+        rows: np.ndarray
+            Sorted positions of the overlapping variants
+        """
+        chroms = np.asarray(chroms, dtype=object)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        hits = [np.array([], dtype=np.int64)]
+        for contig in pd.unique(chroms):
+            if contig not in self.contigs:
+                continue
+            selected = chroms == contig
+            q_starts, q_ends = starts[selected], ends[selected]
+            for v_starts, v_ends, rows, reach in self.contigs[contig]:
+                # Variants starting inside an interval cover a range of
+                # the sorted starts, marked at once with a difference array
+                lo = np.searchsorted(v_starts, q_starts, "left")
+                hi = np.searchsorted(v_starts, q_ends, "right")
+                size = len(v_starts) + 1
+                marks = np.bincount(lo, minlength=size) - np.bincount(
+                    hi, minlength=size
+                )
+                hits.append(rows[np.cumsum(marks[:-1]) > 0])
+                if reach > 0:
+                    # Variants starting before an interval and reaching in
+                    before = np.searchsorted(
+                        v_starts, q_starts - reach, "left"
+                    )
+                    positions, owners = _spans(before, lo)
+                    reaching = v_ends[positions] >= q_starts[owners]
+                    hits.append(rows[positions[reaching]])
+        return np.unique(np.concatenate(hits))
+
+
+class VCFAccessor:
+    """Genomic region queries of a VCFDataFrame, available as vcf_df.vcf.
+
+    The LocusIndex is built from CHROM, POS and REF on the first query
+    and reused by later ones, until the rows of the frame change. Call
+    reset after modifying CHROM, POS or REF in place.
+
+    Examples
+    --------
+    >>> vcf_df.vcf.query("chr7:117,559,590-117,668,665")
+    >>> vcf_df.vcf.overlap(bed_df)
+    """
+
+    def __init__(self, vcf_df):
+        self._obj = vcf_df
+        self._index = None
+        self._labels = None
+
+    def reset(self):
+        """Drop the LocusIndex, so the next query builds it again."""
+        self._index = None
+        self._labels = None
+
+    @property
+    def index(self):
+        """Interval index of the frame, built on first use."""
+        vcf_df = self._obj
+        if self._index is None or self._labels is not vcf_df.index:
+            starts = vcf_df["POS"].to_numpy(dtype=np.int64)
+            ends = starts
+            if "REF" in vcf_df.columns:
+                ref_len = vcf_df["REF"].astype(str).str.len().to_numpy()
+                ends = starts + np.maximum(ref_len, 1) - 1
+            self._index = LocusIndex(vcf_df["CHROM"], starts, ends)
+            self._labels = vcf_df.index
+        return self._index
+
+    def query(self, regions):
+        """Get the variants overlapping some regions.
+
+        Parameters
+        ----------
+        regions: str or list
+            Regions ("chr1", "chr1:1000", "chr1:1,000-2,000" or
+            (chrom, start, end) tuples, 1-based) or the path to a BED
+            file
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            Overlapping variants, in the order of the frame
+        """
+        if isinstance(regions, str):
+            if regions.lower().endswith(".bed"):
+                regions = _load_bed(regions)
+            else:
+                regions = [regions]
+        parsed = [_parse_region(x) for x in regions]
+        chroms = [x[0] for x in parsed]
+        starts = [1 if x[1] is None else x[1] for x in parsed]
+        ends = [CONTIG_END if x[2] is None else x[2] for x in parsed]
+        return self._obj.iloc[self.index.locate(chroms, starts, ends)]
+
+    def overlap(self, intervals):
+        """Get the variants overlapping the intervals of a BED DataFrame.
+
+        Parameters
+        ----------
+        intervals: pd.DataFrame
+            Intervals in BED coordinates, 0-based and half open, with
+            chrom, start and end columns, or in its first three columns
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            Overlapping variants, in the order of the frame
+        """
+        columns = ["chrom", "start", "end"]
+        if not set(columns) <= set(intervals.columns):
+            columns = intervals.columns[:3]
+        chroms, starts, ends = (intervals[x] for x in columns)
+        rows = self.index.locate(
+            chroms.astype(str).to_numpy(),
+            starts.to_numpy(dtype=np.int64) + 1,
+            ends.to_numpy(dtype=np.int64),
+        )
+        return self._obj.iloc[rows]
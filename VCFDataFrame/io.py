@@ -1,20 +1,515 @@
 """Supports every IO operation."""
+import hashlib
+import itertools
+import json
 import logging
 import os
-from collections import OrderedDict
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from VCFDataFrame.genotypes import _GenotypeBuffer
+from VCFDataFrame.schema import VCFSchema
 
 import cyvcf2
 
+import numpy as np
+
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+try:
+    import pysam
+except ImportError:  # pragma: no cover
+    pysam = None
+
+BATCH_SIZE = 100000
+
+METADATA_PREFIX = b"vcfdataframe."
+
+INFO_LINE = re.compile(
+    r'^##INFO=<ID=([^,]+),Number=([^,]+),Type=([^,]+),Description="([^"]*)"',
+    re.MULTILINE,
+)
+
+CONTIG_LINE = re.compile(r"^##contig=<ID=([^,>]+)", re.MULTILINE)
+
+SITES_COLUMNS = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+VCF_EXTENSIONS = (".vcf", ".vcf.gz", ".bcf")
+
+VARIANT_KEYS = ["CHROM", "POS", "REF", "ALT"]
+
+# Variants further apart start a new region of reference queries
+REFERENCE_GAP = 100000
+
+
+class _ColumnBuffer:
+    """Typed column storage filled in fixed-size batches.
+
+    Values are written into a preallocated NumPy array of ``batch_size``
+    rows, which is stored as a chunk when the batch is flushed. Columns
+    that only show up after some rows were read are backfilled with the
+    missing value, so every buffer always spans all rows.
+    """
+
+    def __init__(self, dtype, batch_size, offset=0, fill=np.nan):
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        self.batch_size = batch_size
+        self.chunks = []
+        self.batch = None
+        if offset:
+            self.chunks.append(self._empty(offset))
+
+    def _empty(self, size):
+        return np.full(size, self.fill, dtype=self.dtype)
+
+    def _promote(self):
+        """Fall back to object storage when a value does not fit."""
+        self.dtype = np.dtype(object)
+        self.chunks = [chunk.astype(object) for chunk in self.chunks]
+        if self.batch is not None:
+            self.batch = self.batch.astype(object)
+
+    def set(self, row, value):
+        if self.batch is None:
+            self.batch = self._empty(self.batch_size)
+        try:
+            self.batch[row] = value
+        except (TypeError, ValueError):
+            self._promote()
+            self.batch[row] = value
+
+    def flush(self, size):
+        if self.batch is None:
+            self.chunks.append(self._empty(size))
+        else:
+            self.chunks.append(self.batch[:size])
+        self.batch = None
+
+    def to_array(self):
+        if not self.chunks:
+            return self._empty(0)
+        array = np.concatenate(self.chunks)
+        self.chunks = []
+        return array
+
+
+def _info_types(vcf_reads):
+    """Map every INFO ID in the header to its (Type, Number) pair."""
+    return VCFSchema.from_reader(vcf_reads).info_types
+
+
+def _info_dtype(info_type):
+    """Dtype used to buffer an INFO field with the given (Type, Number).
+
+    Single valued Integer and Float fields are stored as float64 so
+    missing values can be represented, every other field (strings,
+    flags and multi valued fields) is kept as object. Multi valued
+    fields are stored as comma separated strings, as written in the VCF.
+    """
+    if info_type[0] in ["Float", "Integer"] and info_type[1] == "1":
+        return np.float64
+    return object
+
+
+def _genotype_buffer(vcf_reads, format_fields):
+    """Make a _GenotypeBuffer for format_fields, None if they are not read.
+
+    format_fields True reads every FORMAT field in the header. GT is
+    always read, as the alleles of the Genotypes.
+    """
+    if not format_fields:
+        return None
+    format_types = dict()
+    for x in vcf_reads.header_iter():
+        if x.type == "FORMAT" and x["ID"] != "GT":
+            format_types[x["ID"]] = (x["Type"], x["Number"])
+    if format_fields is not True:
+        missing = set(format_fields) - set(format_types) - {"GT"}
+        if missing:
+            raise ValueError(f"FORMAT fields not in header: {missing}")
+        format_types = {
+            k: v for k, v in format_types.items() if k in format_fields
+        }
+    return _GenotypeBuffer(vcf_reads.samples, format_types)
+
+
+def _build_frame(
+    variants,
+    info_types,
+    batch_size=BATCH_SIZE,
+    info_keys=(),
+    genotypes=None,
+    info_fields=None,
+    info_found=None,
+):
+    """Build a DataFrame from an iterable of cyvcf2 variants.
+
+    Parameters
+    ----------
+    variants
+        Iterable of cyvcf2.Variant, usually a cyvcf2.Reader.
+    info_types
+        Dict mapping INFO IDs to (Type, Number), as returned by
+        _info_types.
+    batch_size
+        Number of rows allocated for each batch of the column buffers.
+    info_keys
+        INFO IDs that get a column even if no variant has them, placed
+        before the ones that are found while reading.
+    genotypes
+        Optional _GenotypeBuffer. The Genotypes read are stored in the
+        "genotypes" item of the DataFrame attrs.
+    info_fields
+        Optional INFO IDs to read, the rest are skipped. Columns follow
+        the order of info_fields instead of order of appearance.
+    info_found
+        Optional dict where the INFO IDs found are added as keys, in
+        order of first appearance, even when info_keys already built
+        their columns.
+
+    Returns
+    -------
+    vcf_df
+        DataFrame with one row per variant, fixed fields first and INFO
+        fields in order of first appearance.
+    """
+    columns = {
+        "CHROM": _ColumnBuffer(object, batch_size),
+        "POS": _ColumnBuffer(np.int64, batch_size, fill=0),
+        "REF": _ColumnBuffer(object, batch_size),
+        "ALT": _ColumnBuffer(object, batch_size),
+        "ID": _ColumnBuffer(object, batch_size),
+        "QUAL": _ColumnBuffer(np.float64, batch_size),
+        "FILTER": _ColumnBuffer(object, batch_size),
+    }
+    for key in info_keys:
+        columns[key] = _ColumnBuffer(
+            _info_dtype(info_types.get(key, ("String", "."))), batch_size
+        )
+    n_rows = 0
+    row = 0
+    for variant in variants:
+        columns["CHROM"].set(row, variant.CHROM)
+        columns["POS"].set(row, variant.POS)
+        columns["REF"].set(row, variant.REF)
+        columns["ALT"].set(row, ",".join(variant.ALT))
+        columns["ID"].set(row, variant.ID)
+        columns["QUAL"].set(row, variant.QUAL)
+        columns["FILTER"].set(row, variant.FILTER)
+        if info_fields is None:
+            info = variant.INFO
+        else:
+            variant_info = variant.INFO
+            info = [(key, variant_info.get(key)) for key in info_fields]
+        for key, value in info:
+            if value is None:
+                continue
+            if info_found is not None and key not in info_found:
+                info_found[key] = None
+            if key not in columns:
+                columns[key] = _ColumnBuffer(
+                    _info_dtype(info_types.get(key, ("String", "."))),
+                    batch_size,
+                    offset=n_rows,
+                )
+            if isinstance(value, tuple):
+                value = ",".join(map(str, value))
+            columns[key].set(row, value)
+        if genotypes is not None:
+            genotypes.add(variant)
+        row += 1
+        if row == batch_size:
+            for buffer in columns.values():
+                buffer.flush(row)
+            n_rows += row
+            row = 0
+    for buffer in columns.values():
+        buffer.flush(row)
+    n_rows += row
+    data = dict()
+    for key, buffer in columns.items():
+        array = buffer.to_array()
+        if (
+            info_types.get(key, ("String",))[0] == "Integer"
+            and array.dtype == np.float64
+            and not np.isnan(array).any()
+        ):
+            array = array.astype(np.int64)
+        data[key] = array
+    vcf_df = pd.DataFrame(data, index=pd.RangeIndex(n_rows))
+    if genotypes is not None:
+        vcf_df.attrs["genotypes"] = genotypes.to_genotypes()
+    return vcf_df
+
+
+def _is_stream(vcf):
+    """Check if vcf is stdin ("-") or a file object with a descriptor."""
+    if isinstance(vcf, str):
+        return vcf == "-"
+    try:
+        vcf.fileno()
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+def _open_vcf(vcf, threads=None):
+    """Validate a VCF path and open it with cyvcf2.
+
+    Parameters
+    ----------
+    vcf
+        Path to the vcf to open, plain or bgzipped VCF or BCF, "-" for
+        stdin or a file object with a file descriptor, like an open file
+        or sys.stdin. Compression is detected from the content.
+    threads
+        Number of htslib threads decompressing BGZF blocks while records
+        are parsed, None to decompress in the reading thread.
+
+    Returns
+    -------
+    vcf_reads
+        cyvcf2.Reader for the vcf
+    name
+        Sample Name
+    """
+    if _is_stream(vcf):
+        logging.info("Parsing VCF stream")
+        name = os.path.basename(str(getattr(vcf, "name", "-")))
+    else:
+        if not isinstance(vcf, str):
+            logging.error(f"Received argument was {vcf}.")
+            raise TypeError(
+                "argument must be a string, path to a VCF File, or a file "
+                "object with a file descriptor"
+            )
+        if not vcf.lower().endswith(VCF_EXTENSIONS):
+            logging.error(f"Received argument was {vcf}.")
+            raise TypeError("filepath must end with .vcf, .vcf.gz or .bcf")
+        if not os.path.exists(vcf):
+            logging.error(f"Received argument was {vcf}.")
+            raise FileNotFoundError("File not found in vcf path")
+        logging.info(f"Parsing VCF File: {vcf}")
+        name = vcf.split("/")[-1]
+    vcf_reads = cyvcf2.Reader(vcf, threads=threads)
+    if len(vcf_reads.samples) > 0:
+        name = vcf_reads.samples[0]
+    return vcf_reads, name
+
+
+def _parse_region(region):
+    """Parse a region to a (chrom, start, end) tuple, 1-based inclusive.
+
+    Accepts "chrom", "chrom:pos", "chrom:start-end" (thousands separators
+    are allowed) or an already built tuple. start and end are None when
+    the whole contig is requested.
+    """
+    if isinstance(region, tuple):
+        if len(region) == 1:
+            return (str(region[0]), None, None)
+        if len(region) == 3:
+            return (str(region[0]), int(region[1]), int(region[2]))
+        raise ValueError(f"Invalid region: {region}")
+    if not isinstance(region, str):
+        raise TypeError("regions must be strings or tuples")
+    chrom, _, span = region.strip().rpartition(":")
+    if not chrom:
+        return (span, None, None)
+    span = span.replace(",", "")
+    try:
+        if "-" in span:
+            start, end = span.split("-", 1)
+            return (chrom, int(start), int(end))
+        return (chrom, int(span), int(span))
+    except ValueError:
+        raise ValueError(f"Invalid region: {region}")
+
+
+def _load_bed(bed):
+    """Read regions from a BED file, converting them to 1-based."""
+    if not os.path.exists(bed):
+        logging.error(f"Received argument was {bed}.")
+        raise FileNotFoundError("File not found in bed path")
+    regions = list()
+    with open(bed) as bed_file:
+        for line in bed_file:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.split("\t")
+            regions.append((fields[0], int(fields[1]) + 1, int(fields[2])))
+    return regions
+
+
+def _merge_regions(regions, seqnames=()):
+    """Sort and merge overlapping regions.
+
+    Regions are sorted by contig following seqnames (contigs missing from
+    it go last, in the order received) and then by start. Overlapping or
+    adjacent regions on the same contig are merged, and a whole contig
+    region absorbs every other region on it.
+    """
+    if isinstance(regions, str):
+        if regions.lower().endswith(".bed"):
+            regions = _load_bed(regions)
+        else:
+            regions = [regions]
+    contig_order = {chrom: i for i, chrom in enumerate(seqnames)}
+    by_contig = dict()
+    for region in regions:
+        chrom, start, end = _parse_region(region)
+        if start is not None and start > end:
+            raise ValueError(f"Invalid region: {region}")
+        by_contig.setdefault(chrom, []).append((start, end))
+    for chrom in by_contig:
+        contig_order.setdefault(chrom, len(contig_order))
+    merged = list()
+    for chrom in sorted(by_contig, key=contig_order.get):
+        spans = by_contig[chrom]
+        if any(start is None for start, _ in spans):
+            merged.append((chrom, None, None))
+            continue
+        spans.sort()
+        current_start, current_end = spans[0]
+        for start, end in spans[1:]:
+            if start <= current_end + 1:
+                current_end = max(current_end, end)
+            else:
+                merged.append((chrom, current_start, current_end))
+                current_start, current_end = start, end
+        merged.append((chrom, current_start, current_end))
+    return merged
+
+
+def _split_regions(vcf_reads, regions, n_pieces):
+    """Split regions in about n_pieces consecutive pieces.
+
+    Parameters
+    ----------
+    vcf_reads
+        cyvcf2.Reader of an indexed VCF.
+    regions
+        Regions as returned by _merge_regions, or None for the whole VCF.
+    n_pieces
+        Number of pieces wanted. Whole contigs of unknown length are
+        never split, so the result can have more or fewer pieces.
+
+    Returns
+    -------
+    pieces
+        List of (chrom, start, end) regions in the same order. The last
+        piece of a whole contig has end None, reaching its end.
+    """
+    lengths = dict()
+    if len(vcf_reads.seqlens) == len(vcf_reads.seqnames):
+        lengths = dict(zip(vcf_reads.seqnames, vcf_reads.seqlens))
+    if regions is None:
+        regions = [(chrom, None, None) for chrom in vcf_reads.seqnames]
+    spans = list()
+    for chrom, start, end in regions:
+        if start is None and lengths.get(chrom, 0) > 0:
+            spans.append((chrom, 1, lengths[chrom], True))
+        else:
+            spans.append((chrom, start, end, False))
+    total = sum(end - start + 1 for _, start, end, _ in spans if start)
+    piece_size = max(total // max(n_pieces, 1), 1)
+    pieces = list()
+    for chrom, start, end, whole in spans:
+        if start is None:
+            pieces.append((chrom, None, None))
+            continue
+        while end - start + 1 > piece_size:
+            pieces.append((chrom, start, start + piece_size - 1))
+            start += piece_size
+        pieces.append((chrom, start, None if whole else end))
+    return pieces
+
+
+def _query_regions(vcf_reads, regions, previous=(None, None)):
+    """Yield the variants overlapping regions using the VCF index.
+
+    Regions must be merged and sorted, as returned by _merge_regions.
+    A variant overlapping two consecutive regions is only yielded once.
+
+    Parameters
+    ----------
+    vcf_reads
+        cyvcf2.Reader of an indexed VCF.
+    regions
+        List of (chrom, start, end) regions.
+    previous
+        (chrom, end) of the region read before the first one, when a
+        list of regions is read in several pieces.
+    """
+    previous_chrom, previous_end = previous
+    for chrom, start, end in regions:
+        if start is None:
+            query = chrom
+        elif end is None:
+            query = f"{chrom}:{start}-"
+        else:
+            query = f"{chrom}:{start}-{end}"
+        for variant in vcf_reads(query):
+            if (
+                chrom == previous_chrom
+                and previous_end is not None
+                and variant.start < previous_end
+            ):
+                continue
+            yield variant
+        previous_chrom, previous_end = chrom, end
+
+
+def _is_indexed(vcf):
+    """Check if a VCF is bgzipped and indexed, or a BCF with CSI index."""
+    if not isinstance(vcf, str):
+        return False
+    if vcf.lower().endswith(".bcf"):
+        return os.path.exists(vcf + ".csi")
+    return vcf.lower().endswith(".vcf.gz") and (
+        os.path.exists(vcf + ".tbi") or os.path.exists(vcf + ".csi")
+    )
+
 
-def _load_vcf(vcf):
+def _read_variants(vcf_reads, vcf, regions=None):
+    """Iterate the whole VCF or only the variants in regions."""
+    if regions is None:
+        return iter(vcf_reads)
+    if not _is_indexed(vcf):
+        logging.error(f"Received argument was {vcf}.")
+        raise ValueError(
+            "regions require a bgzipped VCF indexed with tabix or CSI, "
+            "or a BCF indexed with CSI"
+        )
+    return _query_regions(
+        vcf_reads, _merge_regions(regions, vcf_reads.seqnames)
+    )
+
+
+def _load_vcf(vcf, regions=None, format_fields=None, threads=None):
     """VCF Parser to a pd.DataFrame.
 
     Parameters
     ----------
     vcf
-        Path to the vcf to parse.
+        Path to the vcf to parse, or a stream, see _open_vcf.
+    regions
+        Optional list of regions ("chrom:start-end") or path to a BED
+        file. Only variants overlapping them are read, using the index
+        of a bgzipped VCF.
+    format_fields
+        Optional FORMAT IDs, or True for all of them, to read as
+        Genotypes, see _build_frame.
+    threads
+        Optional number of decompression threads, see _open_vcf.
 
     Returns
     -------
@@ -23,54 +518,467 @@ def _load_vcf(vcf):
     name
         Sample Name
     """
-    if not isinstance(vcf, str):
-        logging.error(f"Received argument was {vcf}.")
-        raise TypeError("argument must be a string, path to a VCF File")
-    if not vcf.lower().endswith(".vcf"):
-        logging.error(f"Received argument was {vcf}.")
-        raise TypeError("filepath must end with .vcf")
-    if not os.path.exists(vcf):
-        logging.error(f"Received argument was {vcf}.")
-        raise FileNotFoundError("File not found in vcf path")
-    logging.info(f"Parsing VCF File: {vcf}")
-    vcf_reads = cyvcf2.Reader(vcf)
-    if len(vcf_reads.samples) > 0:
-        name = vcf_reads.samples[0]
-    else:
-        name = vcf.split("/")[-1]
-    variantsDict = OrderedDict()
-    for variant in vcf_reads:
-        variantsDict[
-            variant.CHROM
-            + "+"
-            + str(variant.POS)
-            + "+"
-            + variant.REF
-            + "+"
-            + ",".join(variant.ALT)
-        ] = {
-            "ID": variant.ID,
-            "QUAL": variant.QUAL,
-            "FILTER": variant.FILTER,
-        }
-        variantsDict[
-            variant.CHROM
-            + "+"
-            + str(variant.POS)
-            + "+"
-            + variant.REF
-            + "+"
-            + ",".join(variant.ALT)
-        ].update({k: v for (k, v) in variant.INFO})
-
-    vcf_df = pd.DataFrame.from_dict(variantsDict, orient="index")
-    del variantsDict
-    vcf_df.index = vcf_df.index.str.split("+", expand=True)
-    vcf_df.index.names = ["CHROM", "POS", "REF", "ALT"]
-    vcf_df.reset_index(inplace=True)
+    vcf_reads, name = _open_vcf(vcf, threads)
+    vcf_df = _build_frame(
+        _read_variants(vcf_reads, vcf, regions),
+        _info_types(vcf_reads),
+        genotypes=_genotype_buffer(vcf_reads, format_fields),
+    )
     return vcf_df, name, vcf_reads
 
 
+def _load_pieces(vcf, pieces, previous, format_fields=None):
+    """Parse some pieces of an indexed VCF to a pd.DataFrame.
+
+    Every INFO field of the header gets a column, so the DataFrames of
+    all the pieces have the same columns.
+
+    Parameters
+    ----------
+    vcf
+        Path to an indexed vcf.
+    pieces
+        Regions to read, as returned by _split_regions.
+    previous
+        (chrom, end) of the region read before the first piece.
+    format_fields
+        Optional FORMAT IDs to read as Genotypes, see _load_vcf.
+
+    Returns
+    -------
+    vcf_df
+        DataFrame created from the pieces
+    name
+        Sample Name
+    vcf_reads
+        cyvcf2.Reader the pieces were read from
+    info_found
+        INFO IDs found in the pieces, in order of first appearance
+    """
+    vcf_reads, name = _open_vcf(vcf)
+    info_types = _info_types(vcf_reads)
+    info_found = dict()
+    vcf_df = _build_frame(
+        _query_regions(vcf_reads, pieces, previous),
+        info_types,
+        info_keys=list(info_types),
+        genotypes=_genotype_buffer(vcf_reads, format_fields),
+        info_found=info_found,
+    )
+    return vcf_df, name, vcf_reads, list(info_found)
+
+
+def _iter_vcf(
+    vcf,
+    chunksize,
+    regions=None,
+    format_fields=None,
+    info_fields=None,
+    threads=None,
+    info_keys=None,
+    info_found=None,
+):
+    """VCF Parser yielding pd.DataFrame chunks.
+
+    Every VCF record ends up in exactly one chunk, so multi-allelic
+    records are never split across chunks, and all the chunks have the
+    same columns.
+
+    Parameters
+    ----------
+    vcf
+        Path to the vcf to parse, or a stream, see _open_vcf.
+    chunksize
+        Maximum number of VCF records in each chunk.
+    regions
+        Optional regions to restrict the read to, see _load_vcf.
+    format_fields
+        Optional FORMAT IDs to read as Genotypes, see _load_vcf.
+    info_fields
+        Optional INFO IDs to read, see _build_frame.
+    threads
+        Optional number of decompression threads, see _open_vcf.
+    info_keys
+        INFO IDs every chunk builds a column for, see _build_frame. By
+        default info_fields, or every INFO ID of the header.
+    info_found
+        Optional dict filled with the INFO IDs found in every chunk,
+        see _build_frame.
+
+    Yields
+    ------
+    vcf_df
+        DataFrame created from the next chunksize records
+    name
+        Sample Name
+    vcf_reads
+        cyvcf2.Reader the chunk was read from
+    """
+    if not isinstance(chunksize, int) or chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    vcf_reads, name = _open_vcf(vcf, threads)
+    info_types = _info_types(vcf_reads)
+    if info_keys is None:
+        info_keys = list(info_types) if info_fields is None else info_fields
+    variants = _read_variants(vcf_reads, vcf, regions)
+    batch_size = min(chunksize, BATCH_SIZE)
+    while True:
+        vcf_df = _build_frame(
+            itertools.islice(variants, chunksize),
+            info_types,
+            batch_size,
+            info_keys=info_keys,
+            genotypes=_genotype_buffer(vcf_reads, format_fields),
+            info_fields=info_fields,
+            info_found=info_found,
+        )
+        if len(vcf_df) == 0:
+            break
+        yield vcf_df, name, vcf_reads
+
+
+def _serialize_frame(df):
+    """Serialize a DataFrame to send it between processes.
+
+    Frames are written as an Arrow IPC stream, which is much cheaper to
+    move than pickled object columns. Without pyarrow, or when a column
+    mixes types Arrow cannot store, the frame is returned as is and
+    pickled by the pool.
+    """
+    if pa is None:
+        return df
+    try:
+        table = pa.Table.from_pandas(pd.DataFrame(df))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return df
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _deserialize_frame(data):
+    """Read back a DataFrame serialized with _serialize_frame."""
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def _run_jobs(func, jobs, n_jobs=None, backend="process"):
+    """Run func for every tuple of arguments in jobs.
+
+    Parameters
+    ----------
+    func
+        Function to run, it must be picklable for the process backend.
+    jobs
+        List of argument tuples.
+    n_jobs
+        Number of workers. None or -1 use every CPU and 1 runs serially.
+    backend
+        "process" or "thread".
+
+    Returns
+    -------
+    results
+        List with the result of every job, in the order of jobs.
+    """
+    if backend not in ["process", "thread"]:
+        raise ValueError('backend must be "process" or "thread"')
+    if n_jobs is None or n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if not isinstance(n_jobs, int) or n_jobs < 1:
+        raise ValueError("n_jobs must be a positive integer, -1 or None")
+    if n_jobs == 1 or len(jobs) <= 1:
+        return [func(*job) for job in jobs]
+    if backend == "process":
+        executor_class = ProcessPoolExecutor
+    else:
+        executor_class = ThreadPoolExecutor
+    with executor_class(max_workers=min(n_jobs, len(jobs))) as executor:
+        futures = [executor.submit(func, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def _file_fingerprint(path):
+    """Get the absolute path, size and modification time of a file."""
+    stat = os.stat(path)
+    return dict(
+        path=os.path.abspath(path),
+        size=stat.st_size,
+        mtime=stat.st_mtime_ns,
+    )
+
+
+def _cache_key(vcf, options, version):
+    """Hash a VCF file fingerprint together with the read options.
+
+    The fingerprint is the absolute path, size and modification time of
+    the file, so rewriting the VCF invalidates its cached entries. A BED
+    file of regions is fingerprinted the same way.
+    """
+    regions = options.get("regions")
+    if isinstance(regions, str) and regions.lower().endswith(".bed"):
+        options = dict(options, regions=_file_fingerprint(regions))
+    fingerprint = dict(
+        _file_fingerprint(vcf),
+        version=version,
+        options=options,
+    )
+    serialized = json.dumps(fingerprint, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _cache_entries(cache_dir):
+    """List the (path, mtime, size) of every entry in cache_dir."""
+    entries = list()
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith((".feather", ".pkl")):
+            stat = entry.stat()
+            entries.append((entry.path, stat.st_mtime, stat.st_size))
+    return entries
+
+
+def _read_cache(cache_dir, key):
+    """Read a cached DataFrame and its metadata, None if it is not cached.
+
+    Reading an entry refreshes its modification time, which is what
+    _write_cache uses to evict the least recently used entries.
+    """
+    for ext in [".feather", ".pkl"]:
+        path = os.path.join(cache_dir, key + ext)
+        if os.path.exists(path):
+            break
+    else:
+        return None
+    os.utime(path)
+    if ext == ".pkl":
+        return pd.read_pickle(path)
+    return _read_feather(path)
+
+
+def _write_cache(cache_dir, key, df, metadata, cache_size):
+    """Store a DataFrame and its metadata in cache_dir.
+
+    Frames are written to Feather when pyarrow is installed and to a
+    pickle otherwise. After writing, least recently used entries are
+    removed until the cache fits in cache_size bytes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    table = None
+    if pa is not None:
+        try:
+            table = _frame_to_table(df, metadata)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    if table is None:
+        path = os.path.join(cache_dir, key + ".pkl")
+        pd.to_pickle((pd.DataFrame(df), metadata), path + ".tmp")
+    else:
+        path = os.path.join(cache_dir, key + ".feather")
+        feather.write_feather(table, path + ".tmp")
+    # Readers never see a partially written entry
+    os.replace(path + ".tmp", path)
+    entries = sorted(_cache_entries(cache_dir), key=lambda x: x[1])
+    total = sum(size for _, _, size in entries)
+    for entry_path, _, size in entries:
+        if total <= cache_size:
+            break
+        if entry_path != path:
+            os.remove(entry_path)
+            total -= size
+
+
+def _frame_to_table(df, metadata, preserve_index=None):
+    """Convert a DataFrame to an Arrow table carrying metadata.
+
+    Every item of metadata that is not None is stored in the schema
+    metadata under a "vcfdataframe." prefixed key.
+    """
+    if pa is None:
+        raise ImportError(
+            "pyarrow is required, install it with VCFDataFrame[arrow]"
+        )
+    table = pa.Table.from_pandas(
+        pd.DataFrame(df), preserve_index=preserve_index
+    )
+    schema_metadata = dict(table.schema.metadata or {})
+    for key, value in metadata.items():
+        if value is not None:
+            schema_metadata[METADATA_PREFIX + key.encode()] = str(
+                value
+            ).encode()
+    return table.replace_schema_metadata(schema_metadata)
+
+
+def _table_to_frame(table):
+    """Convert an Arrow table back to a DataFrame and its metadata.
+
+    Columns are returned in the order they had when they were written,
+    which partitioned datasets do not keep.
+    """
+    schema_metadata = table.schema.metadata or {}
+    metadata = {
+        key.decode().split(".", 1)[1]: value.decode()
+        for key, value in schema_metadata.items()
+        if key.startswith(METADATA_PREFIX)
+    }
+    df = table.to_pandas()
+    pandas_metadata = table.schema.pandas_metadata
+    if pandas_metadata is not None:
+        order = [
+            c["name"]
+            for c in pandas_metadata["columns"]
+            if c["name"] in df.columns
+        ]
+        df = df[order + [c for c in df.columns if c not in order]]
+    return df, metadata
+
+
+def _write_parquet(df, path, metadata, partition_cols=None):
+    """Write a DataFrame to Parquet, or to a partitioned dataset."""
+    if partition_cols is None:
+        table = _frame_to_table(df, metadata)
+        pq.write_table(table, path)
+    else:
+        # The index keeps the row order across partitions
+        table = _frame_to_table(df, metadata, preserve_index=True)
+        pq.write_to_dataset(table, path, partition_cols=partition_cols)
+
+
+def _read_parquet(path, columns=None, filters=None):
+    """Read a Parquet file or partitioned dataset to a DataFrame.
+
+    Parameters
+    ----------
+    path
+        Path to a Parquet file or to a dataset directory.
+    columns
+        Columns to read, None reads every column.
+    filters
+        Predicates in pyarrow DNF format, like [("CHROM", "==", "chr1")],
+        used to skip partitions and row groups that do not match.
+
+    Returns
+    -------
+    df
+        DataFrame read.
+    metadata
+        Dictionary with the metadata stored by _write_parquet.
+    """
+    if pa is None:
+        raise ImportError(
+            "pyarrow is required, install it with VCFDataFrame[arrow]"
+        )
+    partitioning = None
+    if os.path.isdir(path):
+        # Partition keys are read back as plain values, not dictionaries
+        partitioning = ds.dataset(path, partitioning="hive").partitioning
+    table = pq.read_table(
+        path, columns=columns, filters=filters, partitioning=partitioning
+    )
+    df, metadata = _table_to_frame(table)
+    if partitioning is not None:
+        df = df.sort_index()
+    return df, metadata
+
+
+def _write_feather(df, path, metadata):
+    """Write a DataFrame to Feather, the Arrow IPC file format."""
+    feather.write_feather(_frame_to_table(df, metadata), path)
+
+
+def _read_feather(path, columns=None):
+    """Read a Feather file to a DataFrame and its metadata."""
+    if pa is None:
+        raise ImportError(
+            "pyarrow is required, install it with VCFDataFrame[arrow]"
+        )
+    return _table_to_frame(feather.read_table(path, columns=columns))
+
+
+def _header_info(header):
+    """Map every INFO ID of a raw VCF header to its definition.
+
+    Definitions are dicts with Number, Type and Description, and IDs are
+    kept in header order.
+    """
+    return {
+        info_id: dict(Number=number, Type=info_type, Description=description)
+        for info_id, number, info_type, description in INFO_LINE.findall(
+            header
+        )
+    }
+
+
+def _header_contigs(header):
+    """List the contigs of a raw VCF header, in header order."""
+    return CONTIG_LINE.findall(header)
+
+
+def _sites_header(header):
+    """Make the header of a sites only VCF from a raw VCF header.
+
+    Meta lines are kept and the column line drops FORMAT and samples.
+    """
+    meta = [line for line in header.splitlines() if line.startswith("##")]
+    return "\n".join(meta) + "\n" + SITES_COLUMNS
+
+
+def _write_vcf(
+    path, header, blocks, compress=None, index=False, threaded=True
+):
+    """Write a VCF header and blocks of record lines to path.
+
+    Parameters
+    ----------
+    path
+        Path of the VCF to write.
+    header
+        Header lines, ending with the column line.
+    blocks
+        Iterable of strings holding several record lines each.
+    compress
+        None writes plain text and "bgzip" writes BGZF blocks.
+    index
+        Build a tabix index next to the bgzipped VCF.
+    threaded
+        Write every block in a background thread while the next block
+        is being built.
+    """
+    if compress not in [None, "bgzip"]:
+        raise ValueError('compress must be None or "bgzip"')
+    if index and compress is None:
+        raise ValueError('index needs compress="bgzip"')
+    if compress is not None and pysam is None:
+        raise ImportError(
+            "pysam is required to bgzip, install it with VCFDataFrame[vcf]"
+        )
+    if compress is None:
+        out = open(path, "wb")
+    else:
+        out = pysam.BGZFile(path, "wb")
+    try:
+        out.write(header.encode())
+        if threaded:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = None
+                for block in blocks:
+                    data = block.encode()
+                    if pending is not None:
+                        pending.result()
+                    pending = executor.submit(out.write, data)
+                if pending is not None:
+                    pending.result()
+        else:
+            for block in blocks:
+                out.write(block.encode())
+    finally:
+        out.close()
+    if index:
+        pysam.tabix_index(path, preset="vcf", force=True)
+
+
 def _load_panel(panel):
     try:
         paneldf = pd.ExcelFile(panel).parse("GeneList")
@@ -81,3 +989,117 @@ def _load_panel(panel):
                         Error was: {err}"
         )
     return gene_symbol_list
+
+
+def _reference_windows(chroms, positions, gap=REFERENCE_GAP):
+    """Group variants in regions to query a sorted reference table.
+
+    Variants of a contig closer than gap fall in the same region, so
+    only the reference rows near the variants are read.
+
+    Returns
+    -------
+    regions
+        List of (chrom, start, end), 1-based inclusive
+    rows
+        Positions of the variants in every region
+    """
+    codes, contigs = pd.factorize(np.asarray(chroms, dtype=object))
+    positions = np.asarray(positions, dtype=np.int64)
+    order = np.lexsort((positions, codes))
+    sorted_codes, sorted_positions = codes[order], positions[order]
+    starts = np.flatnonzero(
+        (np.diff(sorted_codes, prepend=-1) != 0)
+        | (np.diff(sorted_positions, prepend=0) > gap)
+    )
+    ends = np.append(starts[1:], len(order))
+    regions = [
+        (
+            contigs[sorted_codes[start]],
+            int(sorted_positions[start]),
+            int(sorted_positions[end - 1]),
+        )
+        for start, end in zip(starts, ends)
+    ]
+    rows = [order[start:end] for start, end in zip(starts, ends)]
+    return regions, rows
+
+
+def _iter_reference(path, regions, columns=None):
+    """Yield the rows of a sorted, indexed reference table in regions.
+
+    Parameters
+    ----------
+    path
+        Parquet file or dataset, bgzipped VCF or BCF with an index, or
+        bgzipped tab separated table indexed with tabix, with a header
+        line naming its columns, starting with "#".
+    regions
+        List of (chrom, start, end) regions, 1-based inclusive.
+    columns
+        Columns to read besides CHROM, POS, REF and ALT, INFO IDs for
+        VCFs. None reads all of them.
+
+    Yields
+    ------
+    rows
+        DataFrame with the reference rows of the next region
+    vcf_reads
+        cyvcf2.Reader of VCF references, whose ALT alleles still have to
+        be split, None for tables
+    """
+    if path.lower().endswith(".parquet") or os.path.isdir(path):
+        read_columns = None if columns is None else VARIANT_KEYS + columns
+        for chrom, start, end in regions:
+            filters = [
+                ("CHROM", "==", chrom),
+                ("POS", ">=", start),
+                ("POS", "<=", end),
+            ]
+            yield _read_parquet(path, read_columns, filters)[0], None
+    elif path.lower().endswith(VCF_EXTENSIONS):
+        if not _is_indexed(path):
+            logging.error(f"Received argument was {path}.")
+            raise ValueError(
+                "reference VCFs must be bgzipped and indexed with tabix or "
+                "CSI, or BCFs indexed with CSI"
+            )
+        vcf_reads, _ = _open_vcf(path)
+        info_types = _info_types(vcf_reads)
+        info_keys = list(info_types) if columns is None else columns
+        contigs = set(vcf_reads.seqnames)
+        for region in regions:
+            variants = list()
+            if region[0] in contigs:
+                variants = _query_regions(vcf_reads, [region])
+            rows = _build_frame(
+                variants,
+                info_types,
+                info_keys=info_keys,
+                info_fields=columns,
+            )
+            if columns is not None:
+                rows = rows[VARIANT_KEYS + columns]
+            yield rows, vcf_reads
+    else:
+        if pysam is None:
+            raise ImportError(
+                "pysam is required to read tabix indexed tables, install "
+                "it with VCFDataFrame[vcf]"
+            )
+        table = pysam.TabixFile(path)
+        names = table.header[-1].lstrip("#").split("\t")
+        names = [x.upper() if x.upper() in VARIANT_KEYS else x for x in names]
+        missing = set(VARIANT_KEYS) - set(names)
+        if missing:
+            raise ValueError(f"Reference columns not found: {missing}")
+        for chrom, start, end in regions:
+            lines = list()
+            if chrom in table.contigs:
+                lines = table.fetch(chrom, start - 1, end)
+            lines = [x.split("\t") for x in lines]
+            rows = pd.DataFrame(lines, columns=names)
+            rows["POS"] = rows["POS"].astype(np.int64)
+            if columns is not None:
+                rows = rows[VARIANT_KEYS + columns]
+            yield rows, None
@@ -0,0 +1,278 @@
+"""Registered processing stages run by read_vcf on parsed VCFs."""
+
+
+class Stage:
+    """A processing step of the read_vcf pipeline.
+
+    Parameters
+    ----------
+    name: str
+        Unique name of the stage, also used in profile reports
+    func: callable
+        Called as func(vcf_df, context), returns the processed
+        VCFDataFrame. context is a dict with the cyvcf2 reader as pVCF,
+        its VCFSchema as schema and every read_vcf processing option,
+        like keep_ann. Functions must be importable to be used with
+        n_jobs
+    reads: list of str, optional
+        Columns the stage processes. The stage is skipped when none of
+        them is in the VCFDataFrame, by default it always runs
+    writes: list of str, optional
+        Columns the stage adds, replaces or removes. scan_vcf parses the
+        reads of the stages writing the selected columns
+    option: str, optional
+        read_vcf option enabling the stage, which is skipped when the
+        option is False or None
+    """
+
+    def __init__(self, name, func, reads=None, writes=(), option=None):
+        self.name = name
+        self.func = func
+        self.reads = None if reads is None else list(reads)
+        self.writes = list(writes)
+        self.option = option
+
+    def __repr__(self):
+        """Represent the stage by its name and function."""
+        func = f"{self.func.__module__}.{self.func.__qualname__}"
+        return f"Stage({self.name!r}, {func})"
+
+    def enabled(self, vcf_df, context):
+        """Whether the stage runs on vcf_df with the given context."""
+        if self.option is not None:
+            value = context.get(self.option)
+            if value is None or value is False:
+                return False
+        return self.reads is None or any(x in vcf_df for x in self.reads)
+
+
+class Pipeline:
+    """Ordered stages run on every parsed VCF.
+
+    Pipelines are immutable, add and drop return new ones. Stages are
+    reordered by building a new Pipeline from them, like
+    Pipeline([pipeline[x] for x in names]).
+
+    Parameters
+    ----------
+    stages: list of Stage
+        Stages in the order they run
+    """
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+        names = self.names
+        if len(set(names)) != len(names):
+            raise ValueError("Stage names must be unique")
+
+    def __repr__(self):
+        """Represent the pipeline by its stages."""
+        return f"Pipeline({self.stages!r})"
+
+    def __len__(self):
+        """Get the number of stages."""
+        return len(self.stages)
+
+    def __iter__(self):
+        """Iterate over the stages in order."""
+        return iter(self.stages)
+
+    def __getitem__(self, name):
+        """Get the stage with the given name."""
+        return self.stages[self._position(name)]
+
+    @property
+    def names(self):
+        """Names of the stages, in order."""
+        return [stage.name for stage in self.stages]
+
+    def _position(self, name):
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError(f"No stage named {name}") from None
+
+    def add(self, stage, before=None, after=None):
+        """Add a stage, at the end or before or after the named stage.
+
+        Returns
+        -------
+        pipeline: Pipeline
+            Pipeline with the stage added
+        """
+        stages = list(self.stages)
+        if before is not None:
+            stages.insert(self._position(before), stage)
+        elif after is not None:
+            stages.insert(self._position(after) + 1, stage)
+        else:
+            stages.append(stage)
+        return Pipeline(stages)
+
+    def drop(self, *names):
+        """Remove the named stages.
+
+        Returns
+        -------
+        pipeline: Pipeline
+            Pipeline without the stages
+        """
+        for name in names:
+            self._position(name)
+        return Pipeline([x for x in self.stages if x.name not in names])
+
+    def sources(self, columns):
+        """Get the columns the stages writing columns read, recursively.
+
+        Columns no stage writes are their own source.
+        """
+        sources = set()
+        pending = list(columns)
+        while pending:
+            column = pending.pop()
+            if column in sources:
+                continue
+            sources.add(column)
+            for stage in self.stages:
+                if column in stage.writes and stage.reads is not None:
+                    pending += stage.reads
+        return sources
+
+    def run(self, vcf_df, context, profiler):
+        """Run the enabled stages on vcf_df, in order.
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            Processed VCFDataFrame
+        """
+        for stage in self.stages:
+            if stage.enabled(vcf_df, context):
+                vcf_df = profiler.run(stage.name, stage.func, vcf_df, context)
+        return vcf_df
+
+
+def filter_panel(vcf_df, context):
+    """Drop the annotations on other genes and the variants left bare."""
+    return vcf_df._filter_panel_variants(
+        context["schema"], context["gene_symbol_list"]
+    )
+
+
+def treat_alt_alleles(vcf_df, context):
+    """Split multiallelic variants in one row per ALT allele."""
+    return vcf_df._treat_alt_alleles(context["schema"])
+
+
+def priorize_annotations(vcf_df, context):
+    """Keep the most severe annotations, one row each."""
+    priority_dict = context["priorize_ann"]
+    return vcf_df._priorize_annotations(
+        context["schema"],
+        priority_dict if isinstance(priority_dict, dict) else None,
+        context.get("gene_symbol_list"),
+        context.get("keep_ann", "top"),
+    )
+
+
+def upper_columns(vcf_df, context):
+    """Upper case every column name."""
+    vcf_df.columns = vcf_df.columns.str.upper()
+    return vcf_df
+
+
+def calc_aminochange(vcf_df, context):
+    """Add AMINOCHANGE from HGVS.P."""
+    vcf_df._calc_aminochange()
+    return vcf_df
+
+
+def map_zigosity(vcf_df, context):
+    """Replace the HOM and HET flags by ZIGOSITY."""
+    return vcf_df._map_zigosity()
+
+
+def process_ESP6500(vcf_df, context):
+    """Split ESP6500 frequencies and the PolyPhen prediction."""
+    return vcf_df._process_ESP6500()
+
+
+def rename_columns(vcf_df, context):
+    """Rename the ANN effect and impact columns and ID."""
+    return vcf_df._rename_columns()
+
+
+def process_CLINVAR(vcf_df, context):
+    """Translate CLINVAR significance codes."""
+    return vcf_df._process_CLINVAR()
+
+
+def round_num_cols(vcf_df, context):
+    """Round numeric columns."""
+    return vcf_df._round_num_cols(context["schema"], context["round_nums"])
+
+
+DEFAULT_PIPELINE = Pipeline(
+    [
+        Stage(
+            "filter_panel",
+            filter_panel,
+            reads=["ANN"],
+            writes=["ANN"],
+            option="gene_symbol_list",
+        ),
+        Stage("treat_alt_alleles", treat_alt_alleles),
+        Stage(
+            "priorize_annotations",
+            priorize_annotations,
+            reads=["ANN"],
+            writes=["ANN"],
+            option="priorize_ann",
+        ),
+        Stage("upper_columns", upper_columns),
+        Stage(
+            "calc_aminochange",
+            calc_aminochange,
+            reads=["HGVS.P"],
+            writes=["AMINOCHANGE"],
+            option="aminochange",
+        ),
+        Stage(
+            "map_zigosity",
+            map_zigosity,
+            reads=["HOM", "HET"],
+            writes=["ZIGOSITY", "HOM", "HET"],
+            option="zigosity",
+        ),
+        Stage(
+            "process_ESP6500",
+            process_ESP6500,
+            reads=["ESP6500_MAF", "ESP6500_PH"],
+            writes=[
+                "ESP6500_MAF",
+                "ESP6500_MAF_EA",
+                "ESP6500_MAF_AA",
+                "ESP6500_MAF_ALL",
+                "ESP6500_PH",
+                "POLYPHEN_PRED",
+                "POLYPHEN_SCORE",
+            ],
+            option="parse_ESP",
+        ),
+        Stage(
+            "rename_columns",
+            rename_columns,
+            reads=["ANNOTATION", "ANNOTATION_IMPACT", "ID"],
+            writes=["EFFECT", "IMPACT", "RSID"],
+            option="parse_ESP",
+        ),
+        Stage(
+            "process_CLINVAR",
+            process_CLINVAR,
+            reads=["CLINVAR_CLNSIG"],
+            writes=["CLINVAR_CLNSIG"],
+            option="parse_CLINVAR",
+        ),
+        Stage("round_num_cols", round_num_cols, option="round_nums"),
+    ]
+)
@@ -0,0 +1,150 @@
+"""Opt-in timing and memory records of the read_vcf pipeline stages."""
+import logging
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+REPORT_COLUMNS = [
+    "stage",
+    "calls",
+    "seconds",
+    "rows_in",
+    "rows_out",
+    "process_peak_rss",
+    "allocated",
+]
+
+
+def _peak_rss():
+    """Peak resident set size of the process in bytes, None if unknown.
+
+    The peak is the highest of the whole life of the process, not of a
+    single stage.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _rows(value):
+    """Rows of value, or of its first item for tuples, if a DataFrame."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+class Profiler:
+    """Records the wall time, rows and memory of every pipeline stage.
+
+    Pass it, or True, as the profile argument of read_vcf and get the
+    report from the profile property of the result. Every record is
+    also logged at INFO level.
+
+    Parameters
+    ----------
+    callback: callable, optional
+        Called with the record of every stage, a dict with the
+        REPORT_COLUMNS keys, as soon as the stage ends
+    memory: bool
+        Trace the peak bytes allocated by every stage with tracemalloc.
+        Tracing slows reads down, and memory allocated inside cyvcf2 is
+        not traced
+    """
+
+    def __init__(self, callback=None, memory=False):
+        self.callback = callback
+        self.memory = memory
+        self.records = []
+
+    def run(self, stage, func, *args, **kwargs):
+        """Run func(*args, **kwargs) as a stage of the pipeline.
+
+        Rows in are counted on the first argument and rows out on the
+        result, when they are DataFrames. Steps returning None modify
+        their input in place and keep its rows.
+
+        Returns
+        -------
+        result
+            What func returns
+        """
+        trace = self.memory and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            allocated = tracemalloc.get_traced_memory()[1] if trace else None
+        finally:
+            if trace:
+                tracemalloc.stop()
+        rows_in = _rows(args[0]) if args else None
+        self.add(
+            dict(
+                stage=stage,
+                calls=1,
+                seconds=seconds,
+                rows_in=rows_in,
+                rows_out=rows_in if result is None else _rows(result),
+                process_peak_rss=_peak_rss(),
+                allocated=allocated,
+            )
+        )
+        return result
+
+    def add(self, record):
+        """Add the record of a stage, also one run by a worker process."""
+        self.records.append(record)
+        logging.info(
+            f"Stage {record['stage']}: {record['seconds']:.3f} s, "
+            f"rows {record['rows_in']} -> {record['rows_out']}"
+        )
+        if self.callback is not None:
+            self.callback(record)
+
+    def report(self):
+        """Get the records merged by stage, in the order stages first ran.
+
+        Returns
+        -------
+        report: pd.DataFrame
+            One row per stage with the number of calls, the total
+            seconds and rows, and the highest allocated bytes of its
+            calls. process_peak_rss is the peak RSS of the process when
+            the stage ended, so it covers every earlier stage as well
+        """
+        report = pd.DataFrame(self.records, columns=REPORT_COLUMNS)
+        report = report.astype({x: float for x in REPORT_COLUMNS[3:]})
+        return report.groupby("stage", sort=False).agg(
+            calls=("calls", "sum"),
+            seconds=("seconds", "sum"),
+            rows_in=("rows_in", lambda x: x.sum(min_count=1)),
+            rows_out=("rows_out", lambda x: x.sum(min_count=1)),
+            process_peak_rss=("process_peak_rss", "max"),
+            allocated=("allocated", "max"),
+        )
+
+
+class _NoProfiler:
+    """Runs stages without recording them."""
+
+    records = ()
+
+    def run(self, stage, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def add(self, record):
+        pass
+
+
+NO_PROFILER = _NoProfiler()
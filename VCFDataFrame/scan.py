@@ -0,0 +1,274 @@
+"""Lazy reads of VCF files with deferred filters and projections."""
+import operator
+import sys
+
+from VCFDataFrame.io import (
+    _build_frame,
+    _iter_vcf,
+    _load_panel,
+    _open_vcf,
+)
+from VCFDataFrame.pipeline import DEFAULT_PIPELINE
+from VCFDataFrame.schema import VCFSchema
+
+import numpy as np
+
+import pandas as pd
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, value: column.isin(value),
+    "not in": lambda column, value: ~column.isin(value),
+}
+
+# Fixed fields that processing leaves untouched
+FIXED_FIELDS = ["CHROM", "POS", "REF", "FILTER"]
+
+
+def _apply_filters(vcf_df, filters, formatter, names=None):
+    """Keep the rows of vcf_df matching every (column, op, value).
+
+    Values are compared as collect returns them, formatted by formatter
+    from a DataFrame of the filtered columns. names maps the columns of
+    filters on raw fields to the parsed column holding them.
+    """
+    if not filters:
+        return vcf_df
+    names = names or dict()
+    columns = {x[0]: vcf_df[names.get(x[0], x[0])].to_numpy() for x in filters}
+    values = formatter(pd.DataFrame(columns))
+    keep = np.ones(len(vcf_df), dtype=bool)
+    for column, op, value in filters:
+        keep &= np.asarray(OPERATORS[op](values[column], value), dtype=bool)
+    return vcf_df.loc[keep]
+
+
+class VCFScan:
+    """Lazy read of a VCF, see VCFDataFrame.scan_vcf.
+
+    Every method returns a new VCFScan, nothing is read until collect.
+    """
+
+    def __init__(
+        self, frame_class, vcf, options, filters=(), columns=None, panel=None
+    ):
+        self.frame_class = frame_class
+        self.vcf = vcf
+        self.options = options
+        self.filters = list(filters)
+        self.columns = columns
+        self.panel_path = panel
+
+    def _replace(self, **kwargs):
+        state = dict(
+            filters=self.filters, columns=self.columns, panel=self.panel_path
+        )
+        state.update(kwargs)
+        return VCFScan(self.frame_class, self.vcf, self.options, **state)
+
+    def filter(self, column, op, value):
+        """Keep only the variants where column op value holds.
+
+        Parameters
+        ----------
+        column: str
+            Column of the read VCFDataFrame, like IMPACT or AF
+        op: str
+            One of ==, !=, <, <=, >, >=, in and not in
+        value
+            Value compared against, a list for in and not in. Values are
+            compared as collect returns them, strings with "." for
+            missing values with the default dtypes="str"
+
+        Returns
+        -------
+        scan: VCFScan
+            Scan with the filter added
+        """
+        if op not in OPERATORS:
+            raise ValueError(f"op must be one of {list(OPERATORS)}")
+        return self._replace(filters=self.filters + [(column, op, value)])
+
+    def select(self, *columns):
+        """Keep only the given columns, in that order."""
+        return self._replace(columns=list(columns))
+
+    def panel(self, panel):
+        """Keep only the variants annotated on the genes of a panel file."""
+        return self._replace(panel=panel)
+
+    def collect(self, chunksize=None):
+        """Read the VCF, applying the recorded filters and projections.
+
+        INFO fields that no selected column, filter or processing step
+        needs are not parsed, and filters on fields processing does not
+        change drop rows right after parsing. Chunks are read, processed
+        and filtered one at a time.
+
+        Every chunk is parsed with a column for each INFO field planned,
+        or of the header, so selections and filters find their columns
+        in all of them, and the columns of fields the VCF does not have
+        are dropped at the end.
+
+        Parameters
+        ----------
+        chunksize: int, optional
+            Maximum number of VCF records read at once, by default the
+            whole VCF is read at once
+
+        Returns
+        -------
+        vcf_df: VCFDataFrame
+            The same VCFDataFrame read_vcf followed by the filters and
+            the selection would give, with a fresh index
+        """
+        options = dict(self.options)
+        regions = options.pop("regions", None)
+        dtypes = options.pop("dtypes", "str")
+        gene_symbol_list = None
+        if self.panel_path is not None:
+            gene_symbol_list = _load_panel(self.panel_path)
+        vcf_reads, sample_name = _open_vcf(self.vcf)
+        schema = VCFSchema.from_reader(vcf_reads)
+        info_types = schema.info_types
+        info_fields, early_filters = self._plan(
+            schema, options, gene_symbol_list is not None, dtypes
+        )
+
+        info_keys = list(info_types) if info_fields is None else info_fields
+        info_found = dict()
+
+        def formatter(df):
+            df = df.pipe(self.frame_class)
+            return self.frame_class._format_vcf(df, None, vcf_reads, dtypes)
+
+        vcf_dfs = [
+            self._process_chunk(
+                vcf_df,
+                pVCF,
+                early_filters,
+                gene_symbol_list,
+                options,
+                formatter,
+            )
+            for vcf_df, _, pVCF in _iter_vcf(
+                self.vcf,
+                chunksize or sys.maxsize,
+                regions,
+                info_fields=info_fields,
+                info_keys=info_keys,
+                info_found=info_found,
+            )
+        ]
+        if not vcf_dfs:
+            # An empty VCF still goes through processing, as in read_vcf
+            vcf_dfs.append(
+                self._process_chunk(
+                    _build_frame([], info_types, info_keys=info_keys),
+                    vcf_reads,
+                    early_filters,
+                    gene_symbol_list,
+                    options,
+                    formatter,
+                )
+            )
+        non_empty = [x for x in vcf_dfs if len(x) > 0] or vcf_dfs[:1]
+        vcf_df = pd.concat(non_empty, ignore_index=True)
+        if self.columns is None:
+            columns = self.frame_class._processed_columns(
+                vcf_reads,
+                list(info_found),
+                dict(options, gene_symbol_list=gene_symbol_list),
+            )
+            vcf_df = vcf_df[columns]
+        vcf_df = self.frame_class._format_vcf(
+            vcf_df, sample_name, vcf_reads, dtypes
+        )
+        if gene_symbol_list is not None and len(vcf_df) < 1:
+            raise RuntimeError("Panel Result is empty")
+        return vcf_df
+
+    def _process_chunk(
+        self,
+        vcf_df,
+        pVCF,
+        early_filters,
+        gene_symbol_list,
+        options,
+        formatter,
+    ):
+        """Filter, process and project a chunk of parsed variants.
+
+        Filters compare the values formatted by formatter, the same the
+        returned VCFDataFrame has.
+        """
+        filters, names = early_filters
+        vcf_df = _apply_filters(vcf_df, filters, formatter, names)
+        vcf_df = self.frame_class._process_vcf(
+            vcf_df.reset_index(drop=True),
+            pVCF,
+            gene_symbol_list=gene_symbol_list,
+            **options,
+        )
+        vcf_df = _apply_filters(vcf_df, self.filters, formatter)
+        if self.columns is not None:
+            vcf_df = vcf_df[self.columns]
+        return vcf_df
+
+    def _plan(self, schema, options, panel, dtypes="str"):
+        """Choose the INFO fields to parse and the filters to push down.
+
+        Returns
+        -------
+        info_fields
+            INFO IDs to parse, None to parse all of them
+        early_filters
+            Filters on raw fields, safe to apply right after parsing,
+            and the map of their columns to the raw fields
+        """
+        pipeline = options.get("pipeline") or DEFAULT_PIPELINE
+        written = {x for stage in pipeline for x in stage.writes}
+        info_types = schema.info_types
+        raw_names = {key.upper(): key for key in info_types}
+        # Split per allele whatever their Number, like CLINVAR fields
+        allele_columns = schema.allele_columns(list(info_types))
+        early_filters = list()
+        names = dict()
+        # Rounded Integer fields are formatted as floats, "7.0", as str
+        rounded = options.get("round_nums") is not None and dtypes == "str"
+        for column, op, value in self.filters:
+            if column in FIXED_FIELDS:
+                early_filters.append((column, op, value))
+                continue
+            info_type, number = info_types.get(
+                raw_names.get(column), (None, None)
+            )
+            if column in written or raw_names.get(column) in allele_columns:
+                continue
+            # Floats are rounded while processing, and Number=A and R
+            # fields only get one value per row after splitting alleles
+            if (
+                info_type in ["String", "Flag"]
+                or (info_type == "Integer" and not rounded)
+                or (
+                    info_type == "Float" and options.get("round_nums") is None
+                )
+            ):
+                if number in ["1", "0"]:
+                    early_filters.append((column, op, value))
+                    names[column] = raw_names[column]
+        early_filters = (early_filters, names)
+        if self.columns is None:
+            return None, early_filters
+        needed = set(self.columns) | {x[0] for x in self.filters}
+        fields = pipeline.sources(needed)
+        if options.get("priorize_ann", True) is not False or panel:
+            # Annotation prioritization drops unannotated rows
+            fields.add("ANN")
+        info_fields = [key for key in info_types if key.upper() in fields]
+        return info_fields, early_filters
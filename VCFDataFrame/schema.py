@@ -0,0 +1,107 @@
+"""Header derived INFO schema of VCF files, shared by reads."""
+import hashlib
+import re
+
+INFO_HEADER = re.compile(r"^##INFO=.*$", re.MULTILINE)
+
+# Schemas kept by VCFSchema.from_reader, the oldest is dropped first
+SCHEMA_CACHE_SIZE = 128
+
+# Columns with one value per ALT allele whatever the header says
+ALLELE_COLUMNS = ["ID", "AC", "AF", "SAMPLES_AF", "MLEAC", "MLEAF"]
+ALLELE_COLUMNS += ["VARTYPE", "dbSNPBuildID"]
+ALLELE_PREFIXES = ("1000", "CLINVAR")
+
+_SCHEMAS = dict()
+
+
+def _ann_fields(description):
+    """Get the list of ANN fields from the ANN description."""
+    annhead = description.strip('"Functional annotations: \'"')
+    return [x.strip() for x in annhead.split("|")]
+
+
+class VCFSchema:
+    """INFO fields of a VCF header, as the processing stages use them.
+
+    Build it with from_reader, which parses the header once for every
+    distinct set of INFO lines, so files of a batch sharing a header
+    share the same VCFSchema.
+
+    Parameters
+    ----------
+    info: dict
+        Map of every INFO ID to its (Type, Number, Description), in
+        header order
+    """
+
+    def __init__(self, info):
+        self.info = dict(info)
+        self.info_types = {k: v[:2] for k, v in self.info.items()}
+        # Number=R and G fields keep several values per row, so they are
+        # left out, as well as flags that do not have Number=0
+        self.column_types = {
+            info_id.upper(): info_type
+            for info_id, (info_type, number, _) in self.info.items()
+            if number not in ["R", "G"]
+            and (info_type != "Flag" or number == "0")
+        }
+        self.numeric_columns = [
+            k
+            for k, v in self.column_types.items()
+            if v in ["Float", "Integer"]
+        ]
+        self.allele_numbers = {
+            k: v[1] for k, v in self.info.items() if v[1] in ["A", "R"]
+        }
+        self.ann_fields = None
+        if "ANN" in self.info:
+            self.ann_fields = _ann_fields(self.info["ANN"][2])
+        self._allele_columns = dict()
+
+    @classmethod
+    def from_reader(cls, pVCF):
+        """Get the VCFSchema of the header of a cyvcf2 reader.
+
+        Schemas are cached by a hash of the INFO lines of the header.
+        """
+        info_lines = "\n".join(INFO_HEADER.findall(pVCF.raw_header))
+        key = hashlib.sha1(info_lines.encode()).hexdigest()
+        schema = _SCHEMAS.get(key)
+        if schema is None:
+            info = dict()
+            for x in pVCF.header_iter():
+                if x.type == "INFO":
+                    x = x.info()
+                    info[x["ID"]] = (
+                        x["Type"],
+                        x["Number"],
+                        x.get("Description", ""),
+                    )
+            schema = cls(info)
+            if len(_SCHEMAS) >= SCHEMA_CACHE_SIZE:
+                _SCHEMAS.pop(next(iter(_SCHEMAS)), None)
+            _SCHEMAS[key] = schema
+        return schema
+
+    def allele_columns(self, columns):
+        """Get the columns holding one value per allele and their Number.
+
+        These are the Number=A and Number=R INFO fields of the header,
+        plus ID, dbSNPBuildID and the 1000 Genomes and CLINVAR
+        annotations, which carry one value per ALT allele regardless of
+        what the header says. Results are kept for every set of columns.
+        """
+        key = tuple(columns)
+        if key not in self._allele_columns:
+            allele_cols = {x: "A" for x in ALLELE_COLUMNS}
+            allele_cols.update(
+                {x: "A" for x in key if x.startswith(ALLELE_PREFIXES)}
+            )
+            for info_id, number in self.allele_numbers.items():
+                allele_cols.setdefault(info_id, number)
+            present = set(key)
+            self._allele_columns[key] = {
+                k: v for k, v in allele_cols.items() if k in present
+            }
+        return self._allele_columns[key]
@@ -0,0 +1,43 @@
+"""Fixtures of the read_vcf benchmarks.
+
+Synthetic VCFs are written once per scale and kept in .benchmarks/data,
+so later runs skip generation. Choose the scale with --scale.
+"""
+import os
+
+from benchmarks.synthetic import write_synthetic_vcf
+
+import pytest
+
+SCALES = {"10k": 10000, "1M": 1000000, "10M": 10000000}
+
+DATA_DIR = os.path.join(".benchmarks", "data")
+
+
+def pytest_addoption(parser):
+    """Add the --scale and --samples options."""
+    parser.addoption(
+        "--scale",
+        choices=list(SCALES),
+        default="10k",
+        help="number of variants of the synthetic VCF",
+    )
+    parser.addoption(
+        "--samples",
+        type=int,
+        default=1,
+        help="number of samples of the synthetic VCF",
+    )
+
+
+@pytest.fixture(scope="session")
+def synthetic_vcf(request):
+    """Path to a bgzipped and indexed synthetic VCF of the chosen scale."""
+    pytest.importorskip("pysam")
+    scale = request.config.getoption("--scale")
+    n_samples = request.config.getoption("--samples")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"synthetic-{scale}-{n_samples}.vcf.gz")
+    if not os.path.exists(path + ".tbi"):
+        write_synthetic_vcf(path, SCALES[scale], n_samples=n_samples)
+    return path
@@ -0,0 +1,294 @@
+"""Deterministic synthetic VCF generator for the benchmarks.
+
+Run it as a script to write a VCF without the benchmark suite::
+
+    python -m benchmarks.synthetic synthetic.vcf.gz --variants 1000000
+"""
+import argparse
+
+import numpy as np
+
+try:
+    import pysam
+except ImportError:  # pragma: no cover
+    pysam = None
+
+BASES = np.array(list("ACGT"))
+
+EFFECTS = [
+    ("missense_variant", "MODERATE"),
+    ("synonymous_variant", "LOW"),
+    ("stop_gained", "HIGH"),
+    ("frameshift_variant", "HIGH"),
+    ("splice_region_variant", "LOW"),
+    ("intron_variant", "MODIFIER"),
+    ("upstream_gene_variant", "MODIFIER"),
+    ("downstream_gene_variant", "MODIFIER"),
+    ("3_prime_UTR_variant", "MODIFIER"),
+    ("non_coding_exon_variant", "MODIFIER"),
+]
+
+AMINOACIDS = ["Ala", "Arg", "Asn", "Asp", "Cys", "Gln", "Glu", "Gly", "Met"]
+
+ANN_FIELDS = (
+    "Allele | Annotation | Annotation_Impact | Gene_Name | Gene_ID | "
+    "Feature_Type | Feature_ID | Transcript_BioType | Rank | HGVS.c | "
+    "HGVS.p | cDNA.pos / cDNA.length | CDS.pos / CDS.length | "
+    "AA.pos / AA.length | Distance | ERRORS / WARNINGS / INFO"
+)
+
+CONTIG_LENGTH = 250000000
+
+BLOCK_SIZE = 100000
+
+
+def vcf_header(n_contigs, samples, esp=True, clinvar=True):
+    """Build the header of a synthetic VCF."""
+    lines = ["##fileformat=VCFv4.2"]
+    lines += [
+        f"##contig=<ID=chr{i + 1},length={CONTIG_LENGTH}>"
+        for i in range(n_contigs)
+    ]
+    lines += [
+        '##FILTER=<ID=LowQual,Description="Low quality">',
+        "##INFO=<ID=AC,Number=A,Type=Integer,"
+        'Description="Allele count in genotypes">',
+        "##INFO=<ID=AF,Number=A,Type=Float,"
+        'Description="Allele Frequency">',
+        "##INFO=<ID=DP,Number=1,Type=Integer,"
+        'Description="Approximate read depth">',
+        "##INFO=<ID=HOM,Number=0,Type=Flag,"
+        'Description="Variant is homozygous">',
+        "##INFO=<ID=HET,Number=0,Type=Flag,"
+        'Description="Variant is heterozygous">',
+        "##INFO=<ID=ANN,Number=.,Type=String,"
+        f"Description=\"Functional annotations: '{ANN_FIELDS}' \">",
+    ]
+    if esp:
+        lines += [
+            "##INFO=<ID=ESP6500_MAF,Number=.,Type=String,"
+            'Description="Minor Allele Frequency in percent in the order '
+            'of EA,AA,All">',
+            "##INFO=<ID=ESP6500_PH,Number=.,Type=String,"
+            'Description="polyPhen2 result including prediction class '
+            'and score">',
+        ]
+    if clinvar:
+        lines.append(
+            "##INFO=<ID=CLINVAR_CLNSIG,Number=.,Type=String,"
+            'Description="Variant Clinical Significance">'
+        )
+    lines += [
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">',
+        "##FORMAT=<ID=AD,Number=R,Type=Integer,"
+        'Description="Allelic depths">',
+    ]
+    columns = ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+    if samples:
+        columns += ["FORMAT"] + list(samples)
+    return "\n".join(lines + ["\t".join(columns)]) + "\n"
+
+
+def _annotation(alt, ref, gene, transcript, effect, pos, ref_aa, alt_aa):
+    """Build one ANN annotation."""
+    effect, impact = EFFECTS[effect]
+    return (
+        f"{alt}|{effect}|{impact}|GENE{gene}|GENE{gene}|transcript|"
+        f"NM_{gene:06d}.{transcript + 1}|protein_coding|1/5|"
+        f"c.{pos * 3}{ref}>{alt}|p.{AMINOACIDS[ref_aa]}{pos}"
+        f"{AMINOACIDS[alt_aa]}|{pos * 3}/3000|{pos * 3}/2400|{pos}/800||"
+    )
+
+
+def synthetic_records(
+    n_variants,
+    multiallelic=0.1,
+    n_transcripts=3,
+    esp=True,
+    clinvar=True,
+    n_samples=1,
+    n_contigs=1,
+    seed=0,
+):
+    """Generate blocks of synthetic VCF records.
+
+    Random values are drawn for a whole block at once, so generating
+    millions of records takes minutes instead of hours.
+
+    Parameters
+    ----------
+    n_variants
+        Number of VCF records.
+    multiallelic
+        Fraction of records with two or three ALT alleles.
+    n_transcripts
+        ANN annotations of every ALT allele.
+    esp
+        Add ESP6500_MAF and ESP6500_PH to a third of the records.
+    clinvar
+        Add CLINVAR_CLNSIG to a tenth of the records.
+    n_samples
+        Number of samples, with GT, DP and AD.
+    n_contigs
+        Records are spread evenly on contigs chr1 to chrN. Positions
+        are closer together when a contig holds many records, so they
+        stay below CONTIG_LENGTH.
+    seed
+        Seed of the random generator, the same seed gives the same VCF.
+
+    Yields
+    ------
+    block
+        String with up to BLOCK_SIZE record lines.
+    """
+    rng = np.random.RandomState(seed)
+    per_contig = -(-n_variants // n_contigs)
+    # Steps below CONTIG_LENGTH / per_contig keep POS inside the contig
+    max_step = min(200, CONTIG_LENGTH // per_contig)
+    if max_step < 2:
+        raise ValueError(
+            f"{n_variants} variants do not fit in {n_contigs} contigs of "
+            f"{CONTIG_LENGTH} bases, use more contigs"
+        )
+    pos = 0
+    for start in range(0, n_variants, BLOCK_SIZE):
+        size = min(BLOCK_SIZE, n_variants - start)
+        steps = rng.randint(1, max_step, size)
+        refs = rng.randint(4, size=size)
+        n_alts = np.where(
+            rng.rand(size) < multiallelic, rng.randint(2, 4, size), 1
+        )
+        insertion = rng.rand(size) < 0.1
+        inserted = rng.randint(4, size=size)
+        ann = rng.randint(
+            [len(EFFECTS), 1000, len(AMINOACIDS), len(AMINOACIDS)],
+            size=(size, 3, n_transcripts, 4),
+        )
+        gts = np.sort(rng.randint(0, 4, size=(size, n_samples, 2)), axis=2)
+        depths = rng.randint(0, 60, size=(size, n_samples, 4))
+        dps = rng.randint(10, 500, size)
+        quals = rng.rand(size) * 1000
+        filters = rng.rand(size) < 0.9
+        mafs = rng.rand(size, 3) * 50
+        polyphen = rng.rand(size)
+        clnsig = rng.choice([0, 2, 3, 5, 255], size)
+        lines = list()
+        for j in range(size):
+            i = start + j
+            contig, offset = divmod(i, per_contig)
+            pos = steps[j] if offset == 0 else pos + steps[j]
+            ref = BASES[refs[j]]
+            n_alt = n_alts[j]
+            alts = [b for b in BASES if b != ref][:n_alt]
+            if insertion[j]:
+                alts[-1] = alts[-1] + BASES[inserted[j]]
+            sample_gts = np.minimum(gts[j], n_alt)
+            alt_counts = [
+                int((sample_gts == a + 1).sum()) for a in range(n_alt)
+            ]
+            an = 2 * n_samples
+            first = sample_gts[0]
+            annotations = ",".join(
+                _annotation(alt, ref, i % 20000, t, *ann[j, a, t])
+                for a, alt in enumerate(alts)
+                for t in range(n_transcripts)
+            )
+            info = [
+                "AC=" + ",".join(map(str, alt_counts)),
+                "AF=" + ",".join(f"{c / an:.3f}" for c in alt_counts),
+                f"DP={dps[j]}",
+                "HOM" if first[0] == first[1] and first[0] > 0 else "HET",
+                "ANN=" + annotations,
+            ]
+            if esp and i % 3 == 0:
+                info.append(
+                    "ESP6500_MAF=" + ",".join(f"{x:.4f}" for x in mafs[j])
+                )
+                info.append(f"ESP6500_PH=probably-damaging:{polyphen[j]:.3f}")
+            if clinvar and i % 10 == 0:
+                info.append(f"CLINVAR_CLNSIG={clnsig[j]}")
+            fields = [
+                f"chr{contig + 1}",
+                str(pos),
+                f"rs{i + 1}",
+                ref,
+                ",".join(alts),
+                f"{quals[j]:.2f}",
+                "PASS" if filters[j] else "LowQual",
+                ";".join(info),
+            ]
+            if n_samples:
+                fields.append("GT:DP:AD")
+                fields += [
+                    f"{a}/{b}:{d[: n_alt + 1].sum()}:"
+                    + ",".join(map(str, d[: n_alt + 1]))
+                    for (a, b), d in zip(sample_gts, depths[j])
+                ]
+            lines.append("\t".join(fields))
+        yield "\n".join(lines) + "\n"
+
+
+def write_synthetic_vcf(path, n_variants, n_samples=1, **kwargs):
+    """Write a synthetic VCF to path.
+
+    Paths ending with .gz are bgzipped and tabix indexed, which needs
+    pysam. Other keyword arguments are passed to synthetic_records.
+
+    Returns
+    -------
+    path
+        The path written.
+    """
+    samples = [f"SAMPLE{i + 1}" for i in range(n_samples)]
+    header = vcf_header(
+        kwargs.get("n_contigs", 1),
+        samples,
+        kwargs.get("esp", True),
+        kwargs.get("clinvar", True),
+    )
+    records = synthetic_records(n_variants, n_samples=n_samples, **kwargs)
+    compressed = str(path).endswith(".gz")
+    if compressed:
+        if pysam is None:
+            raise ImportError("pysam is required to write bgzipped VCFs")
+        out = pysam.BGZFile(str(path), "wb")
+    else:
+        out = open(path, "wb")
+    with out:
+        out.write(header.encode())
+        for block in records:
+            out.write(block.encode())
+    if compressed:
+        pysam.tabix_index(str(path), preset="vcf", force=True)
+    return path
+
+
+def main():
+    """Write a synthetic VCF from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="VCF to write, .gz to bgzip it")
+    parser.add_argument("--variants", type=int, default=10000)
+    parser.add_argument("--multiallelic", type=float, default=0.1)
+    parser.add_argument("--transcripts", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=1)
+    parser.add_argument("--contigs", type=int, default=1)
+    parser.add_argument("--no-esp", action="store_true")
+    parser.add_argument("--no-clinvar", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_vcf(
+        args.path,
+        args.variants,
+        n_samples=args.samples,
+        multiallelic=args.multiallelic,
+        n_transcripts=args.transcripts,
+        esp=not args.no_esp,
+        clinvar=not args.no_clinvar,
+        n_contigs=args.contigs,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
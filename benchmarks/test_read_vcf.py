@@ -0,0 +1,127 @@
+"""Benchmarks of read_vcf and of every step of its pipeline.
+
+Run them with pytest-benchmark installed::
+
+    pytest benchmarks/ --scale 1M
+
+Every benchmark stores the peak memory of one extra run, traced with
+tracemalloc, as peak_memory_mb in its extra_info. Memory allocated by
+cyvcf2 itself is not traced, only Python and NumPy allocations.
+"""
+import tracemalloc
+
+from VCFDataFrame import VCFDataFrame
+from VCFDataFrame.io import _load_vcf
+from VCFDataFrame.pipeline import DEFAULT_PIPELINE
+from VCFDataFrame.schema import VCFSchema
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+# Options of the read_vcf defaults given to the pipeline stages
+CONTEXT = dict(
+    priorize_ann=True,
+    aminochange=True,
+    zigosity=True,
+    parse_ESP=True,
+    parse_CLINVAR=True,
+    round_nums=6,
+    gene_symbol_list=None,
+    keep_ann="top",
+)
+
+
+def _peak_memory(func, *args, **kwargs):
+    """Run func once and get its peak traced memory, in MiB."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+@pytest.fixture(scope="session")
+def rounds(request):
+    """Timed rounds, a single one above the smallest scale."""
+    return 5 if request.config.getoption("--scale") == "10k" else 1
+
+
+@pytest.fixture(scope="session")
+def parsed(synthetic_vcf):
+    """Parsed synthetic VCF, with its name and cyvcf2 reader."""
+    return _load_vcf(synthetic_vcf)
+
+
+@pytest.fixture(scope="session")
+def stage_inputs(parsed):
+    """Frame every enabled pipeline stage starts from, and its context."""
+    vcf_df, _, pVCF = parsed
+    vcf_df = vcf_df.pipe(VCFDataFrame)
+    context = dict(CONTEXT, pVCF=pVCF, schema=VCFSchema.from_reader(pVCF))
+    inputs = dict()
+    for stage in DEFAULT_PIPELINE:
+        if stage.enabled(vcf_df, context):
+            inputs[stage.name] = vcf_df
+            vcf_df = stage.func(vcf_df.copy(), context)
+    inputs["format_vcf"] = vcf_df
+    return inputs, context
+
+
+def test_load_vcf(benchmark, synthetic_vcf, rounds):
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(
+        _load_vcf, synthetic_vcf
+    )
+    vcf_df, _, _ = benchmark.pedantic(
+        _load_vcf, args=(synthetic_vcf,), rounds=rounds
+    )
+    assert len(vcf_df) > 0
+
+
+@pytest.mark.parametrize("stage", DEFAULT_PIPELINE.names)
+def test_stage(benchmark, stage_inputs, rounds, stage):
+    inputs, context = stage_inputs
+    if stage not in inputs:
+        pytest.skip(f"{stage} is not enabled on the synthetic VCF")
+    vcf_df = inputs[stage]
+    func = DEFAULT_PIPELINE[stage].func
+
+    def setup():
+        return (vcf_df.copy(), context), {}
+
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(func, *setup()[0])
+    result = benchmark.pedantic(func, setup=setup, rounds=rounds)
+    assert len(result) >= len(vcf_df) or stage == "priorize_annotations"
+
+
+def test_format_vcf(benchmark, parsed, stage_inputs, rounds):
+    _, name, pVCF = parsed
+    vcf_df = stage_inputs[0]["format_vcf"]
+
+    def setup():
+        return (vcf_df.copy(), name, pVCF), {}
+
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(
+        VCFDataFrame._format_vcf, *setup()[0]
+    )
+    result = benchmark.pedantic(
+        VCFDataFrame._format_vcf, setup=setup, rounds=rounds
+    )
+    assert result.name == name
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_read_vcf(benchmark, synthetic_vcf, rounds, n_jobs):
+    benchmark.extra_info["peak_memory_mb"] = _peak_memory(
+        VCFDataFrame.read_vcf, synthetic_vcf, n_jobs=n_jobs
+    )
+    vcf_df = benchmark.pedantic(
+        VCFDataFrame.read_vcf,
+        args=(synthetic_vcf,),
+        kwargs=dict(n_jobs=n_jobs),
+        rounds=rounds,
+    )
+    assert len(vcf_df) > 0
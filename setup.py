@@ -35,6 +35,7 @@ REQS = [
     "matplotlib",
     "matplotlib-venn",
 ]
+EXTRAS = {"arrow": ["pyarrow"], "vcf": ["pysam"]}
 # SETUP #
 setup(
     name="VCFDataFrame",
@@ -47,6 +48,7 @@ setup(
     url="https://github.com/juancgvazquez/MODApy-VCFDataFrame/",
     license="MIT",
     install_requires=REQS,
+    extras_require=EXTRAS,
     packages=find_packages(),
     keywords=["bioinformatics", "genomics", "vcf", "pandas"],
     classifiers=[
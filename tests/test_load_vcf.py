@@ -1,6 +1,16 @@
+from io import BytesIO
 from pathlib import Path
 
-from VCFDataFrame import VCFDataFrame
+from VCFDataFrame import VCFDataFrame, io
+from VCFDataFrame.pipeline import DEFAULT_PIPELINE, Stage
+from VCFDataFrame.profiling import Profiler
+from VCFDataFrame.schema import VCFSchema
+
+import cyvcf2
+
+import numpy as np
+
+import pandas as pd
 
 import pytest
 
@@ -24,3 +34,608 @@ def test_panel_vcf(vcf_panel):
     df = VCFDataFrame.read_vcf(str(TEST_DATA_PATH / "TEST.vcf"))
     df_panel = df.panel(str(TEST_DATA_PATH / "GeneList.xlsx"))
     assert df_panel.equals(vcf_panel)
+    # Chunks concatenated without ignore_index repeat index labels
+    df.index = df.index % 10
+    df_panel = df.panel(str(TEST_DATA_PATH / "GeneList.xlsx"))
+    assert df_panel.reset_index(drop=True).equals(
+        vcf_panel.reset_index(drop=True)
+    )
+
+
+def test_build_frame_batches():
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    vcf_reads = cyvcf2.Reader(vcf)
+    info_types = io._info_types(vcf_reads)
+    df_small = io._build_frame(vcf_reads, info_types, batch_size=4)
+    df = io._load_vcf(vcf)[0]
+    assert len(df_small) == 35
+    assert df_small.equals(df)
+
+
+def test_iter_vcf(parsed_vcf):
+    chunks = list(
+        VCFDataFrame.iter_vcf(str(TEST_DATA_PATH / "TEST.vcf"), chunksize=10)
+    )
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 5]
+    assert all(chunk.name == "TEST" for chunk in chunks)
+    df = pd.concat(chunks, ignore_index=True)
+    assert df["POS"].tolist() == parsed_vcf["POS"].tolist()
+    assert df["GENE_NAME"].tolist() == parsed_vcf["GENE_NAME"].tolist()
+    chunks = list(
+        VCFDataFrame.iter_vcf(str(TEST_DATA_PATH / "TEST.vcf"), chunksize=3)
+    )
+    assert all(chunk.columns.equals(chunks[0].columns) for chunk in chunks)
+    df = pd.concat(chunks, ignore_index=True)[parsed_vcf.columns]
+    assert df.equals(parsed_vcf)
+
+
+def test_read_vcf_regions(parsed_vcf, tmp_path):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf.gz")
+    df = VCFDataFrame.read_vcf(
+        vcf, regions=["chr1:880,000-881,000", "chr1:879000-880300"]
+    )
+    assert df["POS"].tolist() == [
+        879065,
+        879317,
+        879676,
+        879687,
+        880238,
+        880390,
+    ]
+    expected = parsed_vcf.loc[parsed_vcf["POS"].isin(df["POS"]), df.columns]
+    assert df.equals(expected.reset_index(drop=True))
+    bed = tmp_path / "regions.bed"
+    bed.write_text("chr1\t879064\t879317\nchr1\t879300\t879700\n")
+    df_bed = VCFDataFrame.read_vcf(vcf, regions=str(bed))
+    assert df_bed["POS"].tolist() == [879065, 879317, 879676, 879687]
+
+
+def test_merge_regions():
+    regions = ["chr2:5-10", "chr1:100-200", "chr1:150-300", "chr1:301-400"]
+    assert io._merge_regions(regions, ["chr1", "chr2"]) == [
+        ("chr1", 100, 400),
+        ("chr2", 5, 10),
+    ]
+    assert io._merge_regions(["chr1:5-10", "chr1"]) == [("chr1", None, None)]
+
+
+def test_regions_require_index():
+    with pytest.raises(ValueError):
+        VCFDataFrame.read_vcf(
+            str(TEST_DATA_PATH / "TEST.vcf"), regions=["chr1:1-100"]
+        )
+
+
+def test_read_vcf_panel(vcf_panel):
+    df = VCFDataFrame.read_vcf(
+        str(TEST_DATA_PATH / "TEST.vcf"),
+        panel=str(TEST_DATA_PATH / "GeneList.xlsx"),
+    )
+    assert df.name == "TEST"
+    assert set(df["GENE_NAME"]) == {"SAMD11", "LINC00115"}
+    # variants whose top annotation is on a panel gene match panel()
+    expected = vcf_panel.sort_values("POS").reset_index(drop=True)
+    df = df.loc[df["POS"].isin(expected["POS"])].reset_index(drop=True)
+    assert df.equals(expected[df.columns])
+    df = VCFDataFrame.read_vcf(
+        str(TEST_DATA_PATH / "TEST.vcf"),
+        panel=str(TEST_DATA_PATH / "GeneList.xlsx"),
+        priorize_ann=False,
+    )
+    genes = df["ANN"].str.split(",").explode().str.split("|").str[3]
+    assert set(genes) == {"SAMD11", "LINC00115"}
+
+
+def test_treat_alt_alleles():
+    df = VCFDataFrame.read_vcf(str(TEST_DATA_PATH / "MULTIALLELIC.vcf"))
+    df = df.sort_values(["POS", "ALT"]).set_index(["POS", "ALT"])
+    assert len(df) == 7
+    assert df.loc[(200, "T"), ["RSID", "AC", "AF", "RD"]].tolist() == [
+        "rs2",
+        "1.0",
+        "0.25",
+        "4,3",
+    ]
+    assert df.loc[(200, "CA"), ["RSID", "AC", "RD"]].tolist() == [
+        "rs4",
+        "0.0",
+        "4,1",
+    ]
+    assert df.loc[(200, "CA"), "HGVS.P"] == "p.Gln4fs"
+    assert df.loc[(300, "T"), ["RSID", "AC", "RD"]].tolist() == [
+        ".",
+        "0.0",
+        "0,0",
+    ]
+    assert df.loc[(50, "C"), ["RSID", "RD"]].tolist() == ["rs5", "0,8"]
+
+
+def test_keep_ann(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    df_gene = VCFDataFrame.read_vcf(vcf, keep_ann="gene")
+    first = df_gene.loc[df_gene["POS"] == 762273]
+    assert first["GENE_NAME"].tolist() == ["LINC01128", "LINC00115"]
+    assert first["EFFECT"].tolist() == [
+        "upstream_gene_variant",
+        "non_coding_exon_variant",
+    ]
+    top = df_gene.drop_duplicates("POS", keep=False)
+    expected = parsed_vcf.loc[parsed_vcf["POS"].isin(top["POS"])]
+    assert top["GENE_NAME"].tolist() == expected["GENE_NAME"].tolist()
+    df_all = VCFDataFrame.read_vcf(vcf, keep_ann="all")
+    assert (df_all["POS"] == 762273).sum() == 10
+    with pytest.raises(ValueError):
+        VCFDataFrame.read_vcf(vcf, keep_ann="first")
+
+
+def test_typed_dtypes(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    df = VCFDataFrame.read_vcf(vcf, dtypes="typed")
+    assert df.name == "TEST"
+    assert list(df.columns) == list(parsed_vcf.columns)
+    assert df["DP"].dtype == "Int64"
+    assert df["QUAL"].dtype == "float64"
+    assert df["SNP"].dtype == bool
+    for col in ["CHROM", "FILTER", "EFFECT", "IMPACT", "GENE_NAME"]:
+        assert df[col].dtype == "category"
+    expected = pd.to_numeric(parsed_vcf["DP"], errors="coerce")
+    assert df["DP"].astype(float).equals(expected)
+    assert (
+        df["GENE_NAME"].astype(str).tolist()
+        == parsed_vcf["GENE_NAME"].tolist()
+    )
+    with pytest.raises(ValueError):
+        VCFDataFrame.read_vcf(vcf, dtypes="object")
+
+
+def test_read_vcf_cache(parsed_vcf, tmp_path, monkeypatch):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    cache_dir = str(tmp_path / "cache")
+    df = VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir)
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    cached = VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir)
+    assert isinstance(cached, VCFDataFrame)
+    assert cached.name == "TEST"
+    assert cached.equals(parsed_vcf)
+    assert df.equals(parsed_vcf)
+    typed = VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir, dtypes="typed")
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+    cached = VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir, dtypes="typed")
+    assert cached.equals(typed)
+    assert cached["GENE_NAME"].dtype == "category"
+    VCFDataFrame.read_vcf(
+        vcf, cache_dir=cache_dir, zigosity=False, cache_size=0
+    )
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    bed = tmp_path / "regions.bed"
+    bed.write_text("chr1\t879064\t879317\n")
+    kwargs = dict(regions=str(bed), cache_dir=cache_dir)
+    assert len(VCFDataFrame.read_vcf(vcf + ".gz", **kwargs)) == 2
+    bed.write_text("chr1\t879064\t879700\n")
+    assert len(VCFDataFrame.read_vcf(vcf + ".gz", **kwargs)) == 4
+    # Without pyarrow frames are pickled
+    monkeypatch.setattr(io, "pa", None)
+    cache_dir = str(tmp_path / "pickled")
+    VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir)
+    assert [x.suffix for x in (tmp_path / "pickled").iterdir()] == [".pkl"]
+    assert VCFDataFrame.read_vcf(vcf, cache_dir=cache_dir).equals(parsed_vcf)
+
+
+def test_parquet_feather(tmp_path):
+    pytest.importorskip("pyarrow")
+    vcf = str(TEST_DATA_PATH / "MULTIALLELIC.vcf")
+    df = VCFDataFrame.read_vcf(vcf)
+    assert df.header.startswith("##fileformat=VCF")
+    df.to_parquet(str(tmp_path / "df.parquet"))
+    parquet = VCFDataFrame.read_parquet(str(tmp_path / "df.parquet"))
+    assert parquet.equals(df)
+    assert parquet.metadata == df.metadata
+    df.to_feather(str(tmp_path / "df.feather"))
+    feather = VCFDataFrame.read_feather(str(tmp_path / "df.feather"))
+    assert feather.equals(df)
+    assert feather.metadata == df.metadata
+    dataset = str(tmp_path / "dataset")
+    df.to_parquet(dataset, partition_cols=["CHROM"])
+    assert VCFDataFrame.read_parquet(dataset).equals(df)
+    chr1 = VCFDataFrame.read_parquet(
+        dataset, columns=["CHROM", "POS"], filters=[("CHROM", "==", "chr1")]
+    )
+    expected = df.loc[df["CHROM"] == "chr1", ["CHROM", "POS"]]
+    assert chr1.equals(expected)
+    assert chr1.name == "S1"
+
+
+def test_to_vcf(tmp_path):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    df = VCFDataFrame.read_vcf(vcf, keep_ann="gene")
+    path = str(tmp_path / "sites.vcf")
+    df.to_vcf(path, compress=None, index=False, threaded=False)
+    written = VCFDataFrame.read_vcf(path, keep_ann="gene")
+    assert written["GENE_NAME"].tolist() == df["GENE_NAME"].tolist()
+    with pytest.raises(ValueError):
+        df.to_vcf(path, compress=None)
+    # bgzip and tabix need pysam
+    pytest.importorskip("pysam")
+    vcf = str(TEST_DATA_PATH / "MULTIALLELIC.vcf")
+    df = VCFDataFrame.read_vcf(vcf)
+    path = str(tmp_path / "sites.vcf.gz")
+    df.sort_values("POS", ascending=False, kind="mergesort").to_vcf(path)
+    assert (tmp_path / "sites.vcf.gz.tbi").exists()
+    written = VCFDataFrame.read_vcf(path)
+    assert written[df.columns].equals(df)
+    chr2 = VCFDataFrame.read_vcf(path, regions=["chr2"])
+    assert chr2["POS"].tolist() == [50]
+
+
+def test_genotypes():
+    vcf = str(TEST_DATA_PATH / "MULTIALLELIC.vcf")
+    df = VCFDataFrame.read_vcf(vcf, genotypes=True)
+    genotypes = df.genotypes
+    assert genotypes.samples == ["S1", "S2"]
+    assert genotypes.zigosity().values.tolist() == [
+        ["HET", "HOM_REF"],
+        ["HET", "HOM_REF"],
+        ["HET", "HOM_REF"],
+        ["HOM_REF", "HET"],
+        ["HOM", None],
+        ["HOM_REF", None],
+        ["HOM", "HET"],
+    ]
+    assert genotypes.to_frame("DP")["S2"].tolist() == [12, 9, 9, 9, -1, -1, 7]
+    assert genotypes["AD"][1:4, 0].tolist() == [[4, 3], [4, 2], [4, 1]]
+    chr1 = df.loc[df["CHROM"] == "chr1"].sort_values("POS", ascending=False)
+    assert chr1.genotypes.to_frame("GQ")["S1"].tolist() == [
+        18,
+        18,
+        60,
+        60,
+        60,
+        99,
+    ]
+    parallel = VCFDataFrame.read_vcf(
+        vcf + ".gz", genotypes=["DP"], n_jobs=2
+    )
+    assert list(parallel.genotypes.fields) == ["DP"]
+    assert parallel.genotypes.to_frame("DP").equals(genotypes.to_frame("DP"))
+    with pytest.raises(ValueError):
+        VCFDataFrame.read_vcf(vcf).genotypes
+
+
+def test_genotypes_string_format(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    df = VCFDataFrame.read_vcf(vcf, genotypes=True)
+    assert df.equals(parsed_vcf)
+    pgt = df.genotypes.to_frame("PGT")["TEST"]
+    assert pgt.iloc[1] == "1|1"
+    assert df.genotypes["PID"].shape == (len(df), 1)
+
+
+def test_scan_vcf(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    assert VCFDataFrame.scan_vcf(vcf).collect().equals(parsed_vcf)
+    columns = ["CHROM", "POS", "GENE_NAME", "IMPACT", "DP", "ZIGOSITY"]
+    scan = (
+        VCFDataFrame.scan_vcf(vcf, dtypes="typed")
+        .filter("IMPACT", "==", "MODIFIER")
+        .filter("DP", ">", 30)
+        .select(*columns)
+    )
+    typed = VCFDataFrame.read_vcf(vcf, dtypes="typed")
+    keep = (typed["IMPACT"] == "MODIFIER") & (typed["DP"] > 30)
+    expected = typed.loc[keep.to_numpy(), columns].reset_index(drop=True)
+    for chunksize in [None, 7]:
+        collected = scan.collect(chunksize)
+        # Categories of the filtered read only hold the values left
+        assert collected.astype(str).equals(expected.astype(str))
+        assert collected["DP"].dtype == "Int64"
+        assert collected.name == "TEST"
+    panel = str(TEST_DATA_PATH / "GeneList.xlsx")
+    expected = VCFDataFrame.read_vcf(vcf, panel=panel)
+    assert VCFDataFrame.scan_vcf(vcf).panel(panel).collect().equals(expected)
+    with pytest.raises(ValueError):
+        scan.filter("DP", "~", 30)
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [("FILTER", "."), ("RSID", "."), ("SNP", "True"), ("DP", "7.0")],
+)
+def test_scan_vcf_formatted_filters(parsed_vcf, column, value):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    expected = parsed_vcf.loc[parsed_vcf[column] == value]
+    collected = VCFDataFrame.scan_vcf(vcf).filter(column, "==", value)
+    collected = collected.collect()
+    assert len(collected) > 0
+    assert collected.equals(expected.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("column", ["ESP6500_MAF_ALL", "POLYPHEN_PRED"])
+def test_scan_vcf_sparse_columns(parsed_vcf, column):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    expected = parsed_vcf.loc[parsed_vcf[column] != "."]
+    expected = expected[["POS", "ZIGOSITY", column]].reset_index(drop=True)
+    scan = VCFDataFrame.scan_vcf(vcf)
+    assert scan.collect(chunksize=3).equals(parsed_vcf)
+    collected = scan.filter(column, "!=", ".")
+    collected = collected.select("POS", "ZIGOSITY", column).collect(3)
+    assert collected.equals(expected)
+
+
+@pytest.mark.parametrize("value", ["a", "c"])
+def test_scan_vcf_allele_filters(tmp_path, value):
+    vcf = (TEST_DATA_PATH / "MULTIALLELIC.vcf").read_text()
+    info = '##INFO=<ID=CLINVAR_VC,Number=1,Type=String,Description="VC">\n'
+    vcf = vcf.replace("#CHROM", info + "#CHROM")
+    vcf = vcf.replace("DP=10;", "DP=10;CLINVAR_VC=a,b,c;")
+    (tmp_path / "CLINVAR.vcf").write_text(vcf)
+    vcf = str(tmp_path / "CLINVAR.vcf")
+    parsed = VCFDataFrame.read_vcf(vcf)
+    expected = parsed.loc[parsed["CLINVAR_VC"] == value]
+    collected = VCFDataFrame.scan_vcf(vcf).filter("CLINVAR_VC", "==", value)
+    collected = collected.collect()
+    assert len(collected) == 1
+    assert collected.equals(expected.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("backend", ["process", "thread"])
+def test_read_vcfs(parsed_vcf, backend):
+    vcfs = [
+        str(TEST_DATA_PATH / "MULTIALLELIC.vcf"),
+        str(TEST_DATA_PATH / "TEST.vcf"),
+    ]
+    dfs = VCFDataFrame.read_vcfs(vcfs, n_jobs=2, backend=backend)
+    assert [df.name for df in dfs] == ["S1", "TEST"]
+    assert isinstance(dfs[1], VCFDataFrame)
+    assert dfs[1].equals(parsed_vcf)
+    assert dfs[0].equals(VCFDataFrame.read_vcf(vcfs[0]))
+
+
+def test_read_vcf_n_jobs(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf.gz")
+    df = VCFDataFrame.read_vcf(vcf, regions=["chr1:760000-900000"], n_jobs=3)
+    assert df.name == "TEST"
+    assert df.equals(parsed_vcf)
+    vcf = str(TEST_DATA_PATH / "MULTIALLELIC.vcf.gz")
+    df = VCFDataFrame.read_vcf(vcf, n_jobs=2, round_nums=None)
+    assert df.equals(VCFDataFrame.read_vcf(vcf, round_nums=None))
+
+
+def test_read_vcf_profile(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    records = list()
+    profiler = Profiler(callback=records.append, memory=True)
+    df = VCFDataFrame.read_vcf(vcf, profile=profiler)
+    assert df.equals(parsed_vcf)
+    profile = df.profile
+    assert list(profile.index[:3]) == [
+        "load_vcf",
+        "treat_alt_alleles",
+        "priorize_annotations",
+    ]
+    assert profile.index[-1] == "format_vcf"
+    assert len(records) == len(profile)
+    assert (profile["seconds"] >= 0).all()
+    assert (profile["allocated"] > 0).all()
+    assert profile.loc["load_vcf", "rows_out"] == len(parsed_vcf)
+    assert profile.loc["format_vcf", "rows_out"] == len(df)
+    with pytest.raises(ValueError):
+        VCFDataFrame.read_vcf(vcf).profile
+    vcf = str(TEST_DATA_PATH / "MULTIALLELIC.vcf.gz")
+    df = VCFDataFrame.read_vcf(vcf, n_jobs=2, profile=True)
+    assert df.profile.loc["load_vcf", "calls"] > 1
+    assert df.profile["allocated"].isna().all()
+
+
+def _dp_bin(vcf_df, context):
+    vcf_df["DP_BIN"] = pd.to_numeric(vcf_df["DP"]) // 10 * 10
+    return vcf_df
+
+
+def test_pipeline(parsed_vcf):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf")
+    assert DEFAULT_PIPELINE.names[:2] == ["filter_panel", "treat_alt_alleles"]
+    stage = Stage("dp_bin", _dp_bin, reads=["DP"], writes=["DP_BIN"])
+    pipeline = DEFAULT_PIPELINE.add(stage, after="upper_columns")
+    df = VCFDataFrame.read_vcf(vcf, pipeline=pipeline)
+    assert df.drop(columns="DP_BIN").equals(parsed_vcf)
+    assert (df["DP_BIN"] == "30").any()
+    df = VCFDataFrame.read_vcf(
+        vcf, pipeline=DEFAULT_PIPELINE.drop("map_zigosity")
+    )
+    assert "ZIGOSITY" not in df and "HOM" in df
+    moved = DEFAULT_PIPELINE.drop("calc_aminochange").add(
+        DEFAULT_PIPELINE["calc_aminochange"], before="treat_alt_alleles"
+    )
+    # HGVS.P does not exist yet, so aminochange is skipped
+    df = VCFDataFrame.read_vcf(vcf, pipeline=moved)
+    assert "AMINOCHANGE" not in df
+    with pytest.raises(ValueError):
+        DEFAULT_PIPELINE.add(stage).add(stage)
+    with pytest.raises(KeyError):
+        DEFAULT_PIPELINE.drop("missing")
+    assert {"HOM", "HET"} <= DEFAULT_PIPELINE.sources(["ZIGOSITY"])
+    scan = VCFDataFrame.scan_vcf(vcf, pipeline=pipeline)
+    df = scan.select("POS", "DP_BIN").collect()
+    assert list(df.columns) == ["POS", "DP_BIN"]
+
+
+def test_process_ESP6500_CLINVAR():
+    df = VCFDataFrame(
+        {
+            "ESP6500_MAF": ["10.5,20,0.1", "3", None, "x,1,2"],
+            "CLINVAR_CLNSIG": ["5|2", "255", "2,5|255", None],
+        }
+    )
+    df = df._process_ESP6500()._process_CLINVAR()
+    assert df["ESP6500_MAF_EA"].tolist()[:2] == [0.105, 0.03]
+    assert df["ESP6500_MAF_AA"].tolist()[0] == 0.2
+    assert df["ESP6500_MAF_EA"][3] == "x"
+    assert pd.isna(df["ESP6500_MAF_ALL"][1])
+    assert df["CLINVAR_CLNSIG"].tolist() == [
+        "Pathogenic|Benign",
+        "other",
+        "Benign,Pathogenic|other",
+        None,
+    ]
+
+
+def test_vcf_accessor():
+    rng = np.random.RandomState(0)
+    df = VCFDataFrame(
+        {
+            "CHROM": rng.choice(["chr1", "chr2", "chrX"], 500),
+            "POS": rng.randint(1, 10000, 500),
+            "REF": rng.choice(["A", "AT", "ACGTACGT"], 500),
+        }
+    )
+    # A long deletion reaching over most of chr1
+    df.loc[0, ["CHROM", "POS", "REF"]] = ["chr1", 100, "A" * 5000]
+    assert df.vcf.query("chr2:1,000-1,000").equals(
+        df[(df["CHROM"] == "chr2") & (df["POS"] == 1000)]
+    )
+    assert df.vcf.query(["chrX", ("chr9", 1, 10)]).equals(
+        df[df["CHROM"] == "chrX"]
+    )
+    bed = pd.DataFrame(
+        {
+            "chrom": rng.choice(["chr1", "chr2", "chr3"], 200),
+            "start": rng.randint(0, 10000, 200),
+        }
+    )
+    bed["end"] = bed["start"] + rng.randint(1, 50, 200)
+    ends = df["POS"] + df["REF"].str.len() - 1
+    expected = np.zeros(len(df), dtype=bool)
+    for chrom, start, end in bed.itertuples(index=False):
+        expected |= (
+            (df["CHROM"] == chrom) & (df["POS"] <= end) & (ends > start)
+        ).to_numpy()
+    assert df.vcf.overlap(bed).equals(df[expected])
+    index = df.vcf.index
+    assert df.vcf.index is index
+    df.drop(index=[0, 1], inplace=True)
+    assert df.vcf.index is not index
+
+
+def test_read_vcf_bcf_and_streams(parsed_vcf, tmp_path):
+    vcf = str(TEST_DATA_PATH / "TEST.vcf.gz")
+    bcf = str(tmp_path / "TEST.bcf")
+    reader = cyvcf2.VCF(vcf)
+    writer = cyvcf2.Writer(bcf, reader, mode="wb")
+    for variant in reader:
+        writer.write_record(variant)
+    writer.close()
+    assert VCFDataFrame.read_vcf(bcf, threads=2).equals(parsed_vcf)
+    assert VCFDataFrame.read_vcf(vcf, threads=2).equals(parsed_vcf)
+    with open(vcf, "rb") as stream:
+        df = VCFDataFrame.read_vcf(stream, n_jobs=2)
+    assert df.equals(parsed_vcf)
+    with open(str(TEST_DATA_PATH / "TEST.vcf")) as stream:
+        chunks = list(VCFDataFrame.iter_vcf(stream, chunksize=10))
+    positions = pd.concat(chunks, ignore_index=True)["POS"]
+    assert positions.equals(parsed_vcf["POS"])
+    with pytest.raises(TypeError):
+        VCFDataFrame.read_vcf(BytesIO(b"##fileformat=VCFv4.2\n"))
+    with pytest.raises(TypeError):
+        VCFDataFrame.scan_vcf("-")
+
+
+def test_merge_samples(parsed_vcf):
+    multiallelic = VCFDataFrame.read_vcf(
+        str(TEST_DATA_PATH / "MULTIALLELIC.vcf"), genotypes=True
+    )
+    other = VCFDataFrame(parsed_vcf.iloc[:5])
+    other.name = "OTHER"
+    cohort = VCFDataFrame.merge_samples(
+        [str(TEST_DATA_PATH / "TEST.vcf"), multiallelic, other], n_jobs=1
+    )
+    assert list(cohort.columns[7:]) == ["TEST", "S1", "S2", "OTHER"]
+    assert all(isinstance(x, pd.SparseDtype) for x in cohort.dtypes[7:])
+    assert cohort.groupby("CHROM")["POS"].is_monotonic_increasing.all()
+    assert (cohort["N_SAMPLES"] == 2).sum() == 6
+    het = cohort[["TEST", "S1", "S2", "OTHER"]].sparse.to_dense() == 1
+    assert cohort["N_HET"].equals(het.sum(axis=1))
+    shared = cohort.vcf.query(f"chr1:{parsed_vcf['POS'].iloc[0]}")
+    assert shared[["TEST", "OTHER"]].sparse.to_dense().iloc[0].tolist() == [
+        2,
+        2,
+    ]
+    with pytest.raises(ValueError):
+        VCFDataFrame.merge_samples([parsed_vcf, parsed_vcf])
+
+
+def test_vcf_schema():
+    schema = VCFSchema.from_reader(
+        cyvcf2.VCF(str(TEST_DATA_PATH / "TEST.vcf"))
+    )
+    same = VCFSchema.from_reader(
+        cyvcf2.VCF(str(TEST_DATA_PATH / "TEST.vcf.gz"))
+    )
+    other = VCFSchema.from_reader(
+        cyvcf2.VCF(str(TEST_DATA_PATH / "MULTIALLELIC.vcf"))
+    )
+    assert schema is same
+    assert other is not schema
+    assert schema.ann_fields[3] == "Gene_Name"
+    assert schema.info_types["AC"] == ("Integer", "A")
+    assert schema.column_types["1000GP3_DP"] == "Integer"
+    assert "1000GP3_DP" in schema.numeric_columns
+    columns = ["CHROM", "ID", "AC", "1000Gp3_VT", "DP"]
+    allele_cols = schema.allele_columns(columns)
+    assert allele_cols == {"ID": "A", "AC": "A", "1000Gp3_VT": "A"}
+    assert schema.allele_columns(columns) is allele_cols
+
+
+def test_calc_aminochange():
+    hgvs_p = ["p.Ala12Val", "p.Ala12Ala", "p.?", None, "p.Ala12Val"]
+    df = VCFDataFrame(pd.DataFrame({"HGVS.P": hgvs_p}))
+    df._calc_aminochange()
+    expected = ["CHANGE", ".", ".", ".", "CHANGE"]
+    assert df["AMINOCHANGE"].tolist() == expected
+    df["HGVS.P"] = df["HGVS.P"].astype("category")
+    df._calc_aminochange()
+    assert df["AMINOCHANGE"].tolist() == expected
+
+
+def _annotation_reference(parsed_vcf):
+    reference = pd.DataFrame(parsed_vcf[io.VARIANT_KEYS].iloc[::2])
+    reference["SCORE"] = np.arange(len(reference), dtype=float)
+    return reference
+
+
+def test_annotate(parsed_vcf, tmp_path):
+    query = VCFDataFrame(
+        pd.DataFrame(
+            dict(
+                CHROM=["chr1", "chr1", "chr2", "chr3"],
+                POS=[200, 300, 50, 1],
+                REF=["C", "G", "T", "A"],
+                ALT=["G", "T", "C", "C"],
+            )
+        )
+    )
+    df = query.annotate(str(TEST_DATA_PATH / "MULTIALLELIC.vcf.gz"), ["RD"])
+    assert df["RD"].tolist()[:3] == ["4,2", "0,0", "0,8"]
+    assert pd.isna(df["RD"].iloc[3])
+    pysam = pytest.importorskip("pysam")
+    reference = _annotation_reference(parsed_vcf)
+    expected = reference["SCORE"].reindex(parsed_vcf.index)
+    table = tmp_path / "reference.tsv"
+    reference.to_csv(str(table), sep="\t", index=False, header=False)
+    table.write_text("#chrom\tpos\tref\talt\tSCORE\n" + table.read_text())
+    table = pysam.tabix_index(
+        str(table), seq_col=0, start_col=1, end_col=1, meta_char="#"
+    )
+    df = parsed_vcf.annotate(table)
+    assert pd.to_numeric(df["SCORE"]).equals(expected.rename("SCORE"))
+
+
+def test_annotate_parquet(parsed_vcf, tmp_path):
+    pytest.importorskip("pyarrow")
+    reference = _annotation_reference(parsed_vcf)
+    reference.to_parquet(str(tmp_path / "reference.parquet"), index=False)
+    df = parsed_vcf.annotate(
+        str(tmp_path / "reference.parquet"), ["SCORE"], prefix="REF_"
+    )
+    expected = reference["SCORE"].reindex(parsed_vcf.index)
+    assert df["REF_SCORE"].equals(expected.rename("REF_SCORE"))
+    assert df.name == "TEST"